@@ -1,14 +1,50 @@
 from enum import Enum
 import abc
+import functools
+import hashlib
+import logging
 import os
+import threading
 import time
-import matplotlib.pyplot as plt
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-import sys
 from pymatgen.core import Composition,periodic_table
 import pandas as pd
 
 
+logger = logging.getLogger(__name__)
+
+_ppi = None
+
+
+def _get_ppi():
+    """
+    Import PyPhenom on first use and return the cached module afterwards.
+    """
+    global _ppi
+    if _ppi is None:
+        import PyPhenom
+        _ppi = PyPhenom
+    return _ppi
+
+
+def _requires_connection(ret_on_fail=False):
+    """
+    Decorator for PhenomDriver methods that need a connected device.
+
+    If the driver is not connected, the wrapped method is not called and ``ret_on_fail`` is returned instead.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            if not self.is_connected:
+                logger.warning("Device is not connected.")
+                return ret_on_fail
+            return fn(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
 def from_weight_dict( weight_dict) -> Composition:
 
     weight_sum = sum(val / periodic_table.Element(el).atomic_mass for el, val in weight_dict.items())
@@ -80,30 +116,138 @@ class OperationalMode(Enum):
 #     NAVCAM = "NavCam"
 #     SEM = "SEM"
 
+# Mode strings compared against in load() / unload()
+_IM_OPERATIONAL = InstrumentMode.OPERATIONAL.value
+_OM_LOADPOS = OperationalMode.LOAD_POS.value
+_OM_LIVENAV = OperationalMode.LIVE_NAVCAM.value
+
+
 class PhenomDriver():
     """
     Class for controlling a Scanning Electron Microscope (SEM).
     """
-    def __init__(self, license_details):
+    # "elems" (elements quantified by sampler) is set by the caller, not in __init__
+    __slots__ = (
+        "license_details", "phenom", "is_connected", "phenomID", "have_just_move_to_SEM", "elems",
+        "_license_installed", "_mode_cache", "_hfw_cache", "_current_detector", "_spot_cache", "_ppi_lock",
+        "_executor", "_io_pool", "_pending_saves", "_img_cache",
+        "_acquire", "_moveto", "_moveby", "_sethfw", "_gethfw",
+    )
+
+    # Detector name -> ppi.DetectorMode, built on the first set_detector call (PyPhenom is imported lazily)
+    _DETECTOR_MAP = None
+    # Seconds for which a state read (mode, pressure, ...) is reused before querying the device again
+    STATE_CACHE_TTL = 0.2
+    # Maximum number of frames kept in the image cache; the least recently used ones are evicted first
+    IMAGE_CACHE_SIZE = 64
+
+    def __init__(self, license_details, image_cache_dir=None):
         """
         Initialize the Phenom device with license installation.
         
         Args:
             device_name (str): A descriptive name for the Phenom device.
             license_details (dict): Details necessary for license installation, including 'instrument', 'username', 'password', and optionally 'PhenomID' if it's different from the instrument for licensing.
+            image_cache_dir (str): Optional directory in which ``get_image_data`` stores acquired frames, keyed on
+                everything that determines the image (stage position, frame width, detector, high tension, spot size,
+                resolution and frame averaging). Repeated acquisitions with identical settings are then read from disk.
+                The cache holds at most ``IMAGE_CACHE_SIZE`` frames and is cleared whenever a sample is (un)loaded,
+                the device is activated or the view is switched between SEM and navigation camera.
         """
         self.license_details = license_details
         self.phenom = None  # This will be initialized in the connect method
         self.is_connected = False
         self.phenomID = license_details.get('PhenomID', '')  # Optional: Use a specific PhenomID if provided
         self.have_just_move_to_SEM = True
+        self._license_installed = False
+        self._mode_cache = {}
+        # Last known horizontal field width; set by zoom, dropped on mode changes (stage moves keep it)
+        self._hfw_cache = None
+        # Last detector set through set_detector, None when unknown
+        self._current_detector = None
+        # Last spot size set on (or read from) the device
+        self._spot_cache = None
+        # Held around every call into self.phenom so that background acquisitions (see submit_image) do not race
+        # with other commands
+        self._ppi_lock = threading.RLock()
+        self._executor = None
+        # Background writer for save_image(..., wait=False)
+        self._io_pool = None
+        self._pending_saves = []
+        self._img_cache = image_cache_dir
+        if self._img_cache is not None:
+            os.makedirs(self._img_cache, exist_ok=True)
+
+    def _cached(self, key, ttl, fn):
+        """
+        Return the value of ``fn()``, reusing the value stored under ``key`` if it is younger than ``ttl`` seconds.
+        """
+        now = time.monotonic()
+        entry = self._mode_cache.get(key)
+        if entry is not None and now - entry[0] < ttl:
+            return entry[1]
+        value = fn()
+        self._mode_cache[key] = (now, value)
+        return value
+
+    def _get_hfw(self):
+        """
+        Return the horizontal field width, querying the device only if it is not cached.
+        """
+        if self._hfw_cache is None:
+            with self._ppi_lock:
+                self._hfw_cache = self._gethfw()
+        return self._hfw_cache
+
+    def _image_cache_path(self, res_x, res_y, frame_avg):
+        """
+        Return the file in the image cache holding the frame acquired with the current settings.
+
+        Working distance and contrast/brightness are not part of the key; the methods that change them clear
+        the cache instead.
+        """
+        with self._ppi_lock:
+            pos = self.phenom.GetCurrentPos()
+            high_tension = self._cached("high_tension", self.STATE_CACHE_TTL, self.phenom.GetSemHighTension)
+            if self._spot_cache is None:
+                self._spot_cache = self.phenom.GetSemSpotSize()
+        key = (
+            float(pos[0]), float(pos[1]), self._get_hfw(), self._current_detector, high_tension, self._spot_cache,
+            res_x, res_y, frame_avg,
+        )
+        digest = hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest()
+        return os.path.join(self._img_cache, f"{digest}.npy")
+
+    def _clear_image_cache(self):
+        """
+        Remove all frames from the image cache (if enabled).
+        """
+        if self._img_cache is None:
+            return
+        for fname in os.listdir(self._img_cache):
+            if fname.endswith(".npy"):
+                os.remove(os.path.join(self._img_cache, fname))
+
+    def _evict_image_cache(self):
+        """
+        Remove the least recently used frames until the image cache holds at most ``IMAGE_CACHE_SIZE`` of them.
+        """
+        paths = [
+            os.path.join(self._img_cache, fname) for fname in os.listdir(self._img_cache) if fname.endswith(".npy")
+        ]
+        if len(paths) <= self.IMAGE_CACHE_SIZE:
+            return
+        paths.sort(key=os.path.getmtime)
+        for path in paths[:len(paths) - self.IMAGE_CACHE_SIZE]:
+            os.remove(path)
 
     def install_license(self):
         """
-        Install and verify the license for the Phenom device.
+        Install and verify the license for the Phenom device. Subsequent calls are no-ops.
         """
-        if "ppi" not in list(sys.modules.keys()) or "PyPhenom" not in list(sys.modules.keys()):
-            import PyPhenom as ppi
+        if self._license_installed:
+            return
+        ppi = _get_ppi()
         # Extracting license details
         instrument = self.license_details.get('instrument')
         username = self.license_details.get('username')
@@ -112,29 +256,38 @@ class PhenomDriver():
         # Install the license
         ppi.InstallLicense(instrument, username, password)
 
-        # Optionally, verify the license installation
-        for license in ppi.GetLicenses():
-            print('Phenom-ID:', license.instrumentId)
-            print('Username:', license.username)
-            print('Password:', license.password)
+        # Verify the license installation
+        license = next((lic for lic in ppi.GetLicenses() if lic.instrumentId == instrument), None)
+        if license is None:
+            logger.warning("No license found for Phenom-ID %s after installation.", instrument)
+        else:
+            logger.info("Installed license for Phenom-ID %s (user %s).", license.instrumentId, license.username)
+        self._license_installed = True
 
     def connect(self):
         """
-        Connect to the Phenom device.
+        Connect to the Phenom device. Does nothing if the device is already connected.
         """
-        if "ppi" not in list(sys.modules.keys()) or "PyPhenom" not in list(sys.modules.keys()):
-            import PyPhenom as ppi
+        if self.is_connected and self.phenom is not None:
+            return True
+        ppi = _get_ppi()
 
         try:
             if self.phenomID:
                 self.phenom = ppi.Phenom(self.phenomID, self.license_details['username'], self.license_details['password'])
             else:
                 self.phenom = ppi.Phenom()
+            # Bound methods of the calls made in per-sample loops, looked up once per connection
+            self._acquire = self.phenom.SemAcquireImage
+            self._moveto = self.phenom.MoveTo
+            self._moveby = self.phenom.MoveBy
+            self._sethfw = self.phenom.SetHFW
+            self._gethfw = self.phenom.GetHFW
             self.is_connected = True
-            print("Phenom connected successfully.")
+            logger.info("Phenom connected successfully.")
             return True
-        except ImportError:
-            print("Failed to connect to Phenom.")
+        except ppi.Error:
+            logger.error("Failed to connect to Phenom.")
             self.is_connected = False
             return False
 
@@ -143,211 +296,226 @@ class PhenomDriver():
         Disconnect from the Phenom device.
         """
         self.is_connected = False
-        print("Phenom disconnected.")
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.flush_pending_saves()
+        if self._io_pool is not None:
+            self._io_pool.shutdown(wait=True)
+            self._io_pool = None
+        logger.info("Phenom disconnected.")
         return True
     
     def reset_have_just_move_to_SEM(self):
         self.have_just_move_to_SEM = True
 
-    def get_instrument_mode(self) -> str:
+    @_requires_connection((False, None))
+    def get_instrument_mode(self) -> tuple:
         """
         Get the current instrument mode of the Phenom.
 
         Returns:
-            str: The current instrument mode.
+            tuple: (True, str) with the current instrument mode, or (False, None) if not connected.
         """
-        if self.is_connected:
-            try:
-                mode = self.phenom.GetInstrumentMode()
-                print(f"Instrument mode: {mode}")
-                return True, str(mode)
-            except ImportError:
-                print("Error getting instrument mode")
-                return False, None
-        else:
-            print("Device is not connected.")
-            return False, None
+        with self._ppi_lock:
+            mode = self._cached("instrument_mode", self.STATE_CACHE_TTL, lambda: str(self.phenom.GetInstrumentMode()))
+        logger.debug("Instrument mode: %s", mode)
+        return True, mode
 
-    def get_operational_mode(self) -> str:
+    @_requires_connection((False, None))
+    def get_operational_mode(self) -> tuple:
         """
         Get the operational status of the Phenom.
 
         Returns:
-            str: The current operational mode.
+            tuple: (True, str) with the current operational mode, or (False, None) if not connected.
         """
-        if self.is_connected:
-            try:
-                mode = self.phenom.GetOperationalMode()
-                print(f"Operational mode: {mode}")
-                return True, str(mode)
-            except ImportError:
-                print("Error getting operational mode")
-                return False, None
-        else:
-            print("Device is not connected.")
-            return False, None
+        with self._ppi_lock:
+            mode = self._cached("operational_mode", self.STATE_CACHE_TTL, lambda: str(self.phenom.GetOperationalMode()))
+        logger.debug("Operational mode: %s", mode)
+        return True, mode
 
+    @_requires_connection()
     def activate(self):
         """
         Activate the Phenom, transitioning it to operational mode.
         """
-        if self.is_connected:
-            print("Device is connected.")
+        logger.debug("Device is connected.")
+        with self._ppi_lock:
             self.phenom.Activate()
-            return True
-        else:
-            print("Device is not connected.")
-            return False
+        self._clear_image_cache()
+        self._current_detector = None
+        self._hfw_cache = None
+        self._mode_cache.clear()
+        return True
     
+    @_requires_connection()
     def load(self):
         """
         Load the sample. 
         This has to be done when OperationalMode is LoadPos and InstrumentMode is Operational.
         This changes the OperationalMode to LiveNavCam.
         """
-        if self.is_connected:
-            print(str(self.get_instrument_mode()))
-            if self.get_instrument_mode() == InstrumentMode("Operational") and self.get_operational_mode() == OperationalMode("Loadpos"): #"Operational"
+        _, instrument_mode = self.get_instrument_mode()
+        _, operational_mode = self.get_operational_mode()
+        if instrument_mode == _IM_OPERATIONAL and operational_mode == _OM_LOADPOS:
+            with self._ppi_lock:
                 self.phenom.Load()
-                return True
-            else:
-                print("Instrument mode is not in Operational and operational mode is not in Loadpos, activate first.")
-                return False
+            self._clear_image_cache()
+            self._current_detector = None
+            self._hfw_cache = None
+            self._mode_cache.clear()
+            return True
         else:
-            print("Device is not connected.")
+            logger.warning("Instrument mode is not in Operational and operational mode is not in Loadpos, activate first.")
             return False
 
+    @_requires_connection()
     def unload(self):
         """
         Unload the sample. Only unloads the sample and not open door TODO: FIND OPEN DOOR.
         """
-        if self.is_connected:
-            if self.get_instrument_mode() == InstrumentMode("Operational") and self.get_operational_mode() == OperationalMode("LiveNavCam"): 
+        _, instrument_mode = self.get_instrument_mode()
+        _, operational_mode = self.get_operational_mode()
+        if instrument_mode == _IM_OPERATIONAL and operational_mode == _OM_LIVENAV:
+            with self._ppi_lock:
                 self.phenom.Unload()
-                return True
-            else:
-                print("Device is not in Loadpos operational mode.")
-                return False
+            self._clear_image_cache()
+            self._current_detector = None
+            self._hfw_cache = None
+            self._mode_cache.clear()
+            return True
         else:
-            print("Device is not connected.")
+            logger.warning("Device is not in Loadpos operational mode.")
             return False
     
+    @_requires_connection()
     def standby(self):
         """
         Set Phenom in standby mode.
         """
-        if self.is_connected:
+        with self._ppi_lock:
             self.phenom.Standby()
-            return True
-        else:
-            print("Device is not connected.")
-            return False
+        self._mode_cache.clear()
+        return True
 
+    @_requires_connection()
     def to_nav(self):
         """
         Switches the Phenom device to use the navigation camera.
         """
-        if not self.is_connected:
-            print("Device is not connected. Please connect the device first.")
-            return False
-        try:
+        with self._ppi_lock:
             self.phenom.MoveToNavCam()
-            print("Successfully switched to navigation camera.")
-            return True
-        except ImportError:
-            print("Failed to switch to navigation camera")
-            return False
+        self._clear_image_cache()
+        self._current_detector = None
+        self._hfw_cache = None
+        self._mode_cache.clear()
+        logger.info("Successfully switched to navigation camera.")
+        return True
+
+    def _wait_until_operational(self, timeout):
+        """
+        Sleep up to ``timeout`` seconds, polling with a growing interval (1, 2, 4, 8 s) and returning early
+        once the instrument mode is Operational.
+
+        Returns:
+            bool: Whether the instrument became operational before the timeout.
+        """
+        deadline = time.monotonic() + timeout
+        delay = 1.0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(delay, remaining))
+            _, mode = self.get_instrument_mode()
+            if mode == _IM_OPERATIONAL:
+                return True
+            delay = min(delay * 2, 8)
 
-    def to_SEM(self, max_retries):
+    @_requires_connection()
+    def to_SEM(self, max_retries=2):
         """
         Switch to live SEM view.
         max_retries:
-            Maximum number of retries to switch to SEM view (default is 2)
+            Maximum number of retries after the first failed attempt (default is 2). The wait between
+            attempts starts at 5 seconds and doubles each time, up to 20 seconds, but is cut short as soon
+            as the instrument reports being operational.
         """
-        if self.is_connected:
-            wait_time = 30
-            retries = 0
-            while retries < max_retries:
-                try:
+        ppi = _get_ppi()
+        wait_time = 5
+        retries = 0
+        while True:
+            try:
+                with self._ppi_lock:
                     self.phenom.MoveToSem()
-                    print("Successfully switched to SEM view.")
-                    return True
-                except:
-                    retries += 1
-                    print(f'Failed to switch to SEM view. Attempt {retries} of {max_retries}.\nWaiting {wait_time} seconds before retrying.')
-                    time.sleep(wait_time)
-            print("Maximum retries reached. Failed to switch to SEM view.")
-            return False
-        else:
-            print("Device is not connected.")
-            return False
-
+                self._clear_image_cache()
+                self._current_detector = None
+                self._hfw_cache = None
+                self._mode_cache.clear()
+                self.have_just_move_to_SEM = True
+                logger.info("Successfully switched to SEM view.")
+                return True
+            except (ppi.Error, TimeoutError, ConnectionError) as e:
+                if retries >= max_retries:
+                    logger.error("Failed to switch to SEM view: %s", e)
+                    break
+                retries += 1
+                logger.warning(
+                    "Failed to switch to SEM view (%s). Retry %d of %d. Waiting %s seconds before retrying.",
+                    e, retries, max_retries, wait_time,
+                )
+                self._wait_until_operational(wait_time)
+                wait_time = min(wait_time * 2, 20)
+        logger.error("Maximum retries reached. Failed to switch to SEM view.")
+        return False
+
+    @_requires_connection()
     def auto_focus(self):
         """
         Automatically optimize the focus.
         """
-        if self.is_connected:
-            try:
-                self.phenom.SemAutoFocus()
-                print("Auto-focus completed.")
-                return True
-            except ImportError:
-                print("Auto-focus failed")
-                return False
-        else:
-            print("Device is not connected.")
-            return False
+        with self._ppi_lock:
+            self.phenom.SemAutoFocus()
+        self._clear_image_cache()
+        logger.debug("Auto-focus completed.")
+        return True
 
+    @_requires_connection()
     def auto_contrast_brightness(self):
         """
         Automatically optimize contrast and brightness.
         """
-        if self.is_connected:
-            try:
-                self.phenom.SemAutoContrastBrightness()
-                print("Auto-contrast and brightness optimization completed.")
-                return True
-            except ImportError:
-                print("Failed to optimize contrast and brightness")
-                return False
-        else:
-            print("Device is not connected.")
-            return False
+        with self._ppi_lock:
+            self.phenom.SemAutoContrastBrightness()
+        self._clear_image_cache()
+        logger.debug("Auto-contrast and brightness optimization completed.")
+        return True
 
+    @_requires_connection()
     def adjust_focus(self, new_wd):
         """
         Adjust the focus into some working distance in mm.
         """
-        if self.is_connected:
-            try:
-                self.phenom.SetSemWD(new_wd * 0.001)
-                print("Focus adjusted.")
-                return True
-            except ImportError:
-                print("Failed to adjust focus")
-                return False
-        else:
-            print("Device is not connected.")
-            return False
+        with self._ppi_lock:
+            self.phenom.SetSemWD(new_wd * 0.001)
+        self._clear_image_cache()
+        logger.debug("Focus adjusted.")
+        return True
 
+    @_requires_connection()
     def move_to(self, x, y):
         """
         Move to a position specified by absolute coordinates.
         x, y: 
             Stage position in absolute coordinates (in millimeters)
         """
-        if self.is_connected:
-            try:
-                self.phenom.MoveTo(x * 0.001, y * 0.001)
-                print("Movement completed.")
-                return True
-            except ImportError:
-                print("Failed to move")
-                return False
-        else:
-            print("Device is not connected.")
-            return False
+        with self._ppi_lock:
+            self._moveto(x * 0.001, y * 0.001)
+        logger.debug("Movement completed.")
+        return True
 
+    @_requires_connection()
     def move_by(self, delta_x, delta_y):
         """
         Move to a position specified relative to the current position
@@ -356,195 +524,303 @@ class PhenomDriver():
         delta_y: 
             Stage movement in y-direction, in milimeters from the current position.
         """
-        if self.is_connected:
-            try:
-                self.phenom.MoveBy(delta_x * 0.001, delta_y * 0.001)
-                print("Movement completed.")
-                return True
-            except ImportError:
-                print("Failed to move")
-                return False
-        else:
-            print("Device is not connected.")
-            return False
+        with self._ppi_lock:
+            self._moveby(delta_x * 0.001, delta_y * 0.001)
+        logger.debug("Movement completed.")
+        return True
 
-    #TODO: CHK DTYPE
+    @_requires_connection((False, None))
     def position(self):
         """
         Get the current position of the stage.
+
+        Returns:
+            tuple: (True, (x, y)) with the stage position in absolute coordinates (in millimeters, same as ``move_to``),
+            or (False, None) on failure.
         """
-        if self.is_connected:
-            try:
-                pos = self.phenom.GetCurrentPos()
-                print(f"Current position: {pos}")
-                return True, (float(position) for position in pos)
-            except ImportError:
-                print("Failed to get position")
-                return False, None
-        else:
-            print("Device is not connected.")
-            return False, None
+        with self._ppi_lock:
+            pos = self.phenom.GetCurrentPos()
+        logger.debug("Current position: %s", pos)
+        return True, (float(pos[0]) * 1000, float(pos[1]) * 1000)
 
+    @_requires_connection((False, None))
     def get_sem_high_tension(self):
         """ 
         Get the SEM High Tension value (in Volt). 
         """
-        if self.is_connected:
-            value = - self.phenom.GetSemHighTension()
-            print(f"SEM high tension is: {value} Volts.")
-            return True, float(value)
-        else:
-            print("Device is not connected.")
-            return False, None
+        with self._ppi_lock:
+            value = - self._cached("high_tension", self.STATE_CACHE_TTL, self.phenom.GetSemHighTension)
+        logger.debug("SEM high tension is: %s Volts.", value)
+        return True, float(value)
        
+    @_requires_connection()
     def set_sem_high_tension(self, value):
         """ 
         Set the SEM High Tension value (in Volt). 
         """
-        if self.is_connected:
+        with self._ppi_lock:
             self.phenom.SetSemHighTension(-value)
-            print(f"Setting the SEM high tension to {value} Volts.")
-            return True
-        else:
-            print("Device is not connected.")
-            return False
+        self._mode_cache.clear()
+        logger.info("Setting the SEM high tension to %s Volts.", value)
+        return True
 
+    @_requires_connection((False, None))
     def get_sem_spot_size(self):
         """
         Query the current SEM spot size (in Amps / Volt½)
         """
-        if self.is_connected:
-            value=self.phenom.GetSemSpotSize()
-            print(f"SEM Beam intensity (spot size) is: {value} Amps / Volt½")
-            return True, float(value)
-        else:
-            print("Device is not connected.")
-            return False, None
+        if self._spot_cache is None:
+            with self._ppi_lock:
+                self._spot_cache = self.phenom.GetSemSpotSize()
+        value = self._spot_cache
+        logger.debug("SEM Beam intensity (spot size) is: %s Amps / Volt½", value)
+        return True, float(value)
     
+    @_requires_connection()
     def set_sem_spot_size(self,value):
         """
         Set the SEM spot size (in Amps / Volt½)
         Range is between 2.1 and 5.1 Amps / Volt½. Raise error if value is out of range.
         For now should just use one fixed value (MAP) as spot size change might need stigmate calibration.
         """
-        if self.is_connected:
-            if value < 2.1 or value > 5.1:
-                print("SEM Beam intensity (spot size) value out of range. Please use a value between 2.1 and 5.1 Amps / Volt½.")
-                return False
-            self.phenom.SetSemSpotSize(value)
-            value_get=self.phenom.GetSemSpotSize()
-            print(f"SEM Beam intensity (spot size) set to {value_get} Amps / Volt½")
-            return True
-        else:
-            print("Device is not connected.")
+        if not 2.1 <= value <= 5.1:
+            logger.warning("SEM Beam intensity (spot size) value out of range. Please use a value between 2.1 and 5.1 Amps / Volt½.")
             return False
+        with self._ppi_lock:
+            self.phenom.SetSemSpotSize(value)
+        self._spot_cache = value
+        logger.info("SEM Beam intensity (spot size) set to %s Amps / Volt½", value)
+        return True
    
+    @_requires_connection((False, None))
     def get_frame_width(self):
         """
         Get the current frame width.
         """
-        if self.is_connected:
-            try:
-                value=self.phenom.GetHFW()
-                print(f"Frame width (FW) is: {value} mm.")
-                return True, float(value)
-            except ImportError:
-                print("Failed to get frame width")
-                return False, None
-        else:
-            print("Device is not connected.")
-            return False, None
+        value = self._get_hfw()
+        logger.debug("Frame width (FW) is: %s mm.", value)
+        return True, float(value)
 
+    @_requires_connection()
     def zoom(self, amt):
         """
         Zoom in or out by a given amount. 0.5 is 50% zoom in, 2 is 200% zoom out.
         """
-        if self.is_connected:
-            try:
-                current_width = self.phenom.GetHFW()
-                new_width = amt * current_width
-                self.phenom.SetHFW(new_width)
-                print("Zoom adjusted.")
-                return True
-            except ImportError:
-                print("Failed to adjust zoom")
-                return False
-        else:
-            print("Device is not connected.")
-            return False
+        current_width = self._get_hfw()
+        new_width = amt * current_width
+        with self._ppi_lock:
+            self._sethfw(new_width)
+        self._hfw_cache = new_width
+        logger.debug("Zoom adjusted.")
+        return True
 
+    @_requires_connection((False, None))
     def get_magnification(self):
         """
         Returns the image magnification shown in the phenom GUI.
         """
-        if "ppi" not in list(sys.modules.keys()) or "PyPhenom" not in list(sys.modules.keys()):
-            import PyPhenom as ppi
-        if self.is_connected:
-            magnification = ppi.MagnificationFromFieldWidth(self.phenom.GetHFW())
-            return True, float(magnification)
-        else:
-            print("Device is not connected.")
-            return False, None
+        ppi = _get_ppi()
+        magnification = ppi.MagnificationFromFieldWidth(self._get_hfw())
+        return True, float(magnification)
     
+    @_requires_connection((False, None))
     def framewidth(self):
         """Returns the frame width."""
-        if self.is_connected:
-            current_width = self.phenom.GetHFW()
-            return True, current_width
-        else:
-            print("Device is not connected.")
-            return False, None
+        current_width = self._get_hfw()
+        return True, current_width
 
-    def save_image(self, fname, res_x, res_y, frame_avg):
+    @_requires_connection()
+    def save_image(self, fname, res_x, res_y, frame_avg, wait=True):
         """
         Save an SEM image.
+
+        Args:
+            wait (bool): If False, the file is written by a background thread and the method returns as soon as
+                the image is acquired, so the next acquisition can overlap with the disk write. Queued images are
+                written one at a time, in order. Call ``flush_pending_saves`` before reading the files back.
         """
-        if "ppi" not in list(sys.modules.keys()) or "PyPhenom" not in list(sys.modules.keys()):
-            import PyPhenom as ppi
-        if self.is_connected:
-            try:
-                acq = self.phenom.SemAcquireImage(res_x, res_y, frame_avg)
-                ppi.Save(acq, fname)
-                print(f"Image saved as {fname}.")
-                return True
-            except ImportError:
-                print("Failed to save image")
-                return False
-        else:
-            print("Device is not connected.")
+        ppi = _get_ppi()
+        with self._ppi_lock:
+            acq = self._acquire(res_x, res_y, frame_avg)
+        if wait:
+            ppi.Save(acq, fname)
+            logger.info("Image saved as %s.", fname)
+            return True
+        if self._io_pool is None:
+            # A single writer: ppi.Save is never run concurrently with itself, only alongside the next acquisition.
+            self._io_pool = ThreadPoolExecutor(max_workers=1)
+        self._pending_saves = [future for future in self._pending_saves if not future.done() or future.exception()]
+        self._pending_saves.append(self._io_pool.submit(ppi.Save, acq, fname))
+        logger.info("Image queued for saving as %s.", fname)
+        return True
+
+    def flush_pending_saves(self):
+        """
+        Block until all images queued by ``save_image(..., wait=False)`` are written.
+
+        Returns:
+            bool: True if every queued image was written successfully.
+        """
+        success = True
+        for future in self._pending_saves:
+            exc = future.exception()
+            if exc is not None:
+                logger.error("Failed to save image: %s", exc)
+                success = False
+        self._pending_saves = []
+        return success
+
+    @_requires_connection()
+    def save_image_fast(self, fname, res_x=1080, res_y=1080, frame_avg=16):
+        """
+        Save an SEM image as plain pixels (no PyPhenom metadata), in the detector's native dtype.
+
+        The file format is chosen from the extension of ``fname`` (e.g. .tiff or .png); use ``save_image``
+        when the PyPhenom metadata has to be kept.
+        """
+        import cv2
+
+        success, img = self.get_image_data(res_x, res_y, frame_avg)
+        if not success:
+            return False
+        if not cv2.imwrite(fname, img):
+            logger.error("Failed to write image to %s.", fname)
             return False
+        logger.info("Image saved as %s.", fname)
+        return True
 
+    @_requires_connection()
+    def capture_at(self, x, y, fname, res_x=1080, res_y=1080, frame_avg=16, focus=True, acb=True):
+        """
+        Move to a position, optionally auto-focus and auto-adjust contrast/brightness, then save an SEM image.
+
+        Equivalent to ``move_to`` + ``auto_focus`` + ``auto_contrast_brightness`` + ``save_image``, but the
+        connection check and the PyPhenom lock are taken once for the whole sequence.
+
+        Args:
+            x, y: Stage position in absolute coordinates (in millimeters)
+            fname (str): Path of the image file to write.
+            res_x, res_y (int): Image resolution.
+            frame_avg (int): Number of frames to average.
+            focus (bool): Whether to run auto-focus before acquiring.
+            acb (bool): Whether to run auto contrast/brightness before acquiring.
+        """
+        ppi = _get_ppi()
+        with self._ppi_lock:
+            self._moveto(x * 0.001, y * 0.001)
+            if focus:
+                self.phenom.SemAutoFocus()
+            if acb:
+                self.phenom.SemAutoContrastBrightness()
+            if focus or acb:
+                self._clear_image_cache()
+            acq = self._acquire(res_x, res_y, frame_avg)
+        ppi.Save(acq, fname)
+        logger.info("Image at (%s, %s) saved as %s.", x, y, fname)
+        return True
+
+    @_requires_connection(None)
+    def submit_image(self, res_x, res_y, frame_avg):
+        """
+        Start an SEM acquisition in the background and return immediately.
+
+        The acquisition holds the driver's PyPhenom lock, so any other command issued meanwhile (e.g. ``move_to``)
+        waits for it to finish; the caller is free to do other work (saving or analysing the previous frame)
+        while the detector integrates.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the PyPhenom acquisition object, or None if not connected.
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+
+        def acquire():
+            with self._ppi_lock:
+                return self._acquire(res_x, res_y, frame_avg)
+
+        return self._executor.submit(acquire)
+
+    @_requires_connection((False, None))
     def get_image_metadata(self, res_x, res_y, frame_avg):
         """
         Get SEM image data.
         """
-        if self.is_connected:
-            try:
-                acq = self.phenom.SemAcquireImage(res_x, res_y, frame_avg)
-                frame_width = acq.image.width
-                frame_height = acq.image.height
-                pixel_size_width = acq.metadata.pixelSize.width
-                pixel_size_height = acq.metadata.pixelSize.height
-                return True, int(frame_width), int(frame_height), float(pixel_size_width), float(pixel_size_height)
-            except ImportError:
-                print("Failed to get image data")
-                return False, None
-        else:
-            print("Device is not connected.")
-            return False, None
+        with self._ppi_lock:
+            acq = self._acquire(res_x, res_y, frame_avg)
+        frame_width = acq.image.width
+        frame_height = acq.image.height
+        pixel_size_width = acq.metadata.pixelSize.width
+        pixel_size_height = acq.metadata.pixelSize.height
+        return True, int(frame_width), int(frame_height), float(pixel_size_width), float(pixel_size_height)
+
+    @_requires_connection((False, None))
+    def get_image_data(self, res_x, res_y, frame_avg):
+        """
+        Acquire an SEM image and return its pixels.
 
-    def get_pressure(self):
+        Returns:
+            tuple: (True, numpy.ndarray) with the image as a 2D array viewing the acquisition buffer,
+            or (False, None) on failure. Use ``get_image_data_json`` for a JSON-serializable copy.
         """
-        Get the current vacuum pressure in the SEM chamber.
+        cache_path = None
+        # Frames taken with an unknown detector are not cached, as the key could not tell them apart
+        if self._img_cache is not None and self._current_detector is not None:
+            cache_path = self._image_cache_path(res_x, res_y, frame_avg)
+            if os.path.exists(cache_path):
+                logger.debug("Image read from cache %s.", cache_path)
+                # Mark the frame as recently used
+                os.utime(cache_path)
+                return True, np.load(cache_path)
+        with self._ppi_lock:
+            acq = self._acquire(res_x, res_y, frame_avg)
+        img = np.asarray(acq.image)
+        if cache_path is not None:
+            np.save(cache_path, img)
+            self._evict_image_cache()
+        return True, img
+
+    def get_image_data_json(self, res_x, res_y, frame_avg):
         """
-        if self.is_connected:
-            pressure = self.phenom.SemGetVacuumChargeReductionState().pressureEstimate
-            print(f"Current vacuum pressure: {pressure} Pa.")
-            return True, float(pressure)
-        else:
-            print("Device is not connected.")
+        Acquire an SEM image and return its pixels as nested lists, e.g. to send them as JSON.
+        """
+        success, img = self.get_image_data(res_x, res_y, frame_avg)
+        if not success:
             return False, None
+        return True, img.tolist()
+
+    def show_image(self, res_x=1080, res_y=1080, frame_avg=16):
+        """
+        Acquire and display an SEM image.
+        """
+        import matplotlib.pyplot as plt
+
+        success, img = self.get_image_data(res_x, res_y, frame_avg)
+        if not success:
+            logger.warning("No image data to display.")
+            return False
+        plt.imshow(img, cmap='gray', interpolation='none')
+        plt.show()
+        return True
+
+    @_requires_connection((False, None))
+    def get_pressure(self, verbose=True):
+        """
+        Get the current vacuum pressure in the SEM chamber.
 
+        Args:
+            verbose (bool): Whether to log the pressure reading.
+        """
+        with self._ppi_lock:
+            pressure = self._cached(
+                "pressure",
+                self.STATE_CACHE_TTL,
+                lambda: self.phenom.SemGetVacuumChargeReductionState().pressureEstimate,
+            )
+        if verbose:
+            logger.debug("Current vacuum pressure: %s Pa.", pressure)
+        return True, float(pressure)
+
+    @_requires_connection()
     def set_detector(self, detector_name):
         """
         Set the detector to use.
@@ -553,53 +829,64 @@ class PhenomDriver():
             detector_name (str): Name of the detector to use. Can be one of the following:
                 "BSD All", "BSD NorthSouth", "BSD EastWest", "SED", "BSD A", "BSD B", "BSD C", "BSD D"
         """
-        if "ppi" not in list(sys.modules.keys()) or "PyPhenom" not in list(sys.modules.keys()):
-            import PyPhenom as ppi
-        if detector_name == "BSD All":
-            requested_mode = ppi.DetectorMode.All
-        elif detector_name == "BSD NorthSouth":
-            requested_mode = ppi.DetectorMode.NorthSouth
-        elif detector_name == "BSD EastWest":
-            requested_mode = ppi.DetectorMode.EastWest
-        elif detector_name == "SED":
-            if self.get_pressure() > 1:
-                # wait for 2 minute max for the pressure to drop below 1 Pa and check again every 10 seconds
-                for i in range(12):
-                    if self.get_pressure() <= 1:
-                        break
-                    time.sleep(10)
-                if self.get_pressure() > 1:
-                    print("Cannot enable SED when vacuum pressure is above 1 Pa.")
+        ppi = _get_ppi()
+        if PhenomDriver._DETECTOR_MAP is None:
+            PhenomDriver._DETECTOR_MAP = {
+                "BSD All": ppi.DetectorMode.All,
+                "BSD NorthSouth": ppi.DetectorMode.NorthSouth,
+                "BSD EastWest": ppi.DetectorMode.EastWest,
+                "SED": ppi.DetectorMode.Sed,
+                "BSD A": ppi.DetectorMode.A,
+                "BSD B": ppi.DetectorMode.B,
+                "BSD C": ppi.DetectorMode.C,
+                "BSD D": ppi.DetectorMode.D,
+            }
+        try:
+            requested_mode = self._DETECTOR_MAP[detector_name]
+        except KeyError:
+            logger.error(
+                "Invalid viewing mode specified: %r. Expected one of %s.", detector_name, ", ".join(self._DETECTOR_MAP)
+            )
+            return False
+        if detector_name == self._current_detector and detector_name != "SED":
+            logger.debug("Detector already set to %s.", detector_name)
+            return True
+        if detector_name == "SED":
+            pressure = self.get_pressure()[1]
+            if pressure > 1:
+                # wait for 2 minute max for the pressure to drop below 1 Pa, backing off from 1 s up to 10 s between checks
+                deadline = time.monotonic() + 120
+                delay = 1.0
+                while pressure > 1 and time.monotonic() < deadline:
+                    time.sleep(min(delay, max(0, deadline - time.monotonic())))
+                    pressure = self.get_pressure(verbose=False)[1]
+                    delay = min(delay * 1.5, 10)
+                logger.debug("Vacuum pressure after waiting: %s Pa.", pressure)
+                if pressure > 1:
+                    logger.error("Cannot enable SED when vacuum pressure is above 1 Pa (currently %s Pa).", pressure)
                     return False
             try:
-                if self.have_just_move_to_SEM:
+                with self._ppi_lock:
                     self.phenom.SemEnableSed()
+                if self.have_just_move_to_SEM:
                     self.have_just_move_to_SEM = False
                     time.sleep(60)
-                else:
-                    self.phenom.SemEnableSed()
-                requested_mode = ppi.DetectorMode.Sed
             except ppi.Error as e:
-                print(f"Failed to enable SED detector. Error message: {e.args[0]}.")
+                logger.error("Failed to enable SED detector. Error message: %s.", e.args[0])
                 return False
-        elif detector_name == "BSD A":
-            requested_mode = ppi.DetectorMode.A
-        elif detector_name == "BSD B":
-            requested_mode = ppi.DetectorMode.B
-        elif detector_name == "BSD C":
-            requested_mode = ppi.DetectorMode.C
-        elif detector_name == "BSD D":
-            requested_mode = ppi.DetectorMode.D
-        else:
-            print("Invalid viewing mode specified.")
-            return False
+            if self._current_detector == "SED":
+                return True
         try:
-            viewingMode = self.phenom.GetSemViewingMode()
-            viewingMode.scanParams.detector = requested_mode
-            self.phenom.SetSemViewingMode(viewingMode)
-            print(f"Detector set to {detector_name}.")
-        except:
-            print("Failed to set detector.")
+            with self._ppi_lock:
+                viewingMode = self.phenom.GetSemViewingMode()
+                viewingMode.scanParams.detector = requested_mode
+                self.phenom.SetSemViewingMode(viewingMode)
+            self._mode_cache.clear()
+            self._current_detector = detector_name
+            logger.info("Detector set to %s.", detector_name)
+        except ppi.Error as e:
+            self._current_detector = None
+            logger.error("Failed to set detector. Error message: %s.", e)
             return False
         return True
     
@@ -632,18 +919,6 @@ class PhenomDriver():
     #         print("Device is not connected.")
     #         return None
 
-    # def show_image(self):
-    #     """
-    #     Display the SEM image.
-    #     """
-    #     img = self.get_image_data()
-    #     img = np.asarray(img[0])
-    #     if img is not None:
-    #         plt.imshow(img, cmap='gray')
-    #         plt.show()
-    #     else:
-    #         print("No image data to display.")
-
     # def load_pulse_processor_settings(self):
     #     """
     #     Load pulse processor settings.
@@ -664,8 +939,7 @@ class PhenomDriver():
     #     """
     #     Returns the spectroscopy element information for the given element name.
     #     """
-    #     if "ppi" not in list(sys.modules.keys()) or "PyPhenom" not in list(sys.modules.keys()):
-    #         import PyPhenom as ppi
+    #     ppi = _get_ppi()
     #     if self.is_connected:
     #         try:
     #             element = ppi.Spectroscopy.Element(element_name)
@@ -681,8 +955,7 @@ class PhenomDriver():
     #     """
     #     Gets the position using the specified x and y relative coordinates.
     #     """
-    #     if "ppi" not in list(sys.modules.keys()) or "PyPhenom" not in list(sys.modules.keys()):
-    #         import PyPhenom as ppi
+    #     ppi = _get_ppi()
         
     #     try:
     #         position = ppi.Position(x, y)
@@ -708,16 +981,10 @@ class PhenomDriver():
             """
             Runs the EDS Job Analyzer on the Phenom.
             """
-            if "ppi" not in list(sys.modules.keys()) or "PyPhenom" not in list(sys.modules.keys()):
-                import PyPhenom as ppi
-            
-            try:
-                analyzer = ppi.Application.ElementIdentification.EdsJobAnalyzer(self.phenom)
-                print("EDS Job Analyzer initialized successfully.")
-                return analyzer
-            except ImportError:
-                print("Failed to initialize EDS Job Analyzer.")
-                return None
+            ppi = _get_ppi()
+            analyzer = ppi.Application.ElementIdentification.EdsJobAnalyzer(self.phenom)
+            logger.debug("EDS Job Analyzer initialized successfully.")
+            return analyzer
             
         def write_msa_file(msa_data, filename):
             """
@@ -730,31 +997,28 @@ class PhenomDriver():
             Returns:
             - True if the file was written successfully, False otherwise.
             """
-            if "ppi" not in list(sys.modules.keys()) or "PyPhenom" not in list(sys.modules.keys()):
-                import PyPhenom as ppi
+            ppi = _get_ppi()
             
             try:
                 ppi.Spectroscopy.WriteMsaFile(msa_data, filename)
-                print(f"Data written successfully to {filename}.")
+                logger.debug("Data written successfully to %s.", filename)
                 return True
-            except ImportError:
-                print("Failed to import necessary modules for writing MSA file.")
-                return False
             except Exception as e:
-                print(f"An error occurred while writing the MSA file: {e}")
+                logger.error("An error occurred while writing the MSA file: %s", e)
                 return False
         try:
-            if "ppi" not in list(sys.modules.keys()) or "PyPhenom" not in list(sys.modules.keys()):
-                import PyPhenom as ppi
-            analyzer = run_eds_job_analyzer()
+            ppi = _get_ppi()
+            with self._ppi_lock:
+                analyzer = run_eds_job_analyzer()
 
-            # Add a spot at the specified (x, y) position with the given maximum acquisition time
-            spotData = analyzer.AddSpot(ppi.Position(x, y), maxTime=maxTime, maxCounts=30000)
+                # Add a spot at the specified (x, y) position with the given maximum acquisition time
+                spotData = analyzer.AddSpot(ppi.Position(x, y), maxTime=maxTime, maxCounts=30000)
 
-            try:
-                analyzer.Wait()
-            except:  # noqa: E722
-                return None, None
+                try:
+                    analyzer.Wait()
+                except ppi.Error as e:
+                    logger.error("EDS spot acquisition at (x=%s, y=%s) failed: %s", x, y, e)
+                    return None, None
 
             # Retrieve the spot spectrum data from the spotData object
             spec = spotData.spotSpectrum
@@ -770,7 +1034,7 @@ class PhenomDriver():
             return spec, spectrum_data
 
         except Exception as e:
-            print(f"An error occurred during spot spectrum analysis at (x={x}, y={y}): {e}")
+            logger.error("An error occurred during spot spectrum analysis at (x=%s, y=%s): %s", x, y, e)
             return None, None
 
     def sampler(self, base_dir, phase_system, maxTime, index, particle_index):
@@ -794,36 +1058,25 @@ class PhenomDriver():
             Returns:
             - The quantified result if successful, None otherwise.
             """
-            if "ppi" not in list(sys.modules.keys()) or "PyPhenom" not in list(sys.modules.keys()):
-                import PyPhenom as ppi
-            
-            try:
-                quantified_result = ppi.Spectroscopy.Quantify(spectrum, elements)
-                print("Spectrum quantified successfully.")
-                return quantified_result
-            except ImportError:
-                print("Failed to quantify spectrum.")
-                return None
+            ppi = _get_ppi()
+            quantified_result = ppi.Spectroscopy.Quantify(spectrum, elements)
+            logger.debug("Spectrum quantified successfully.")
+            return quantified_result
         # Read samples from CSV file
         path = os.path.join(base_dir, f"Grid_search_{index}")
         samples = pd.read_csv(f"{path}/samples_{particle_index}.csv")
-        nsamples = len(samples)
 
         elements = phase_system.split("-")
-        # Initialize DataFrame for storing sample information
-        z = np.zeros(nsamples)
         labels = pd.read_csv(f"{path}/labels_{particle_index}.csv")
 
-        df = pd.DataFrame({"Particle No.": z, "x": z, "y": z, **{f"{elem}": z for elem in elements}, "Spec": [np.zeros(2048) for _ in range(nsamples)]})  # noqa: E501
-
-        count1 = 0
+        # Accumulate one record per successfully quantified spot
+        records = []
 
         for i in range(1):#len(samples)
             y, x = samples.iloc[i, [-2, -1]].values
             y, x = round((y - labels.shape[0] / 2) / (labels.shape[1]), 4), round((x - labels.shape[1] / 2) / (labels.shape[1]), 4)  # noqa: E501
             # Acquire spectrum and its data
             spec, temp = self.Spot_Spectrum(x, y,path, maxTime=maxTime)
-            df.loc[count1, "Spec"][:] = temp.tolist()
 
             # Remove the temporary spectrum file
             os.remove(f"{path}spectrum{x, y}.msa")
@@ -833,32 +1086,17 @@ class PhenomDriver():
                 q = quantify_spectrum(spec, self.elems)
             except RuntimeError as e:
                 # Handle the runtime error here
-                print("A RuntimeError occurred during runtime:", e)
+                logger.error("A RuntimeError occurred during runtime: %s", e)
                 continue
 
-            count2 = 1
-            df.loc[count1, "x"], df.loc[count1, "y"] = x, y
-            # for elem in q.composition.constituents:
-            for element in elements:
-                bool = True
-                for elem in q.composition.constituents:
-                    if f"{elem.Z}"[-2:] == element:
-                        bool = False
-                        # df.loc[count1, f'q{count2}'] = [f'{elem.weightFraction}']
-                        df.loc[count1, element] = elem.weightFraction
-                if bool:
-                    df.loc[count1, element] = 0
-                count2 += 1
-            count1 += 1
-
-        #last_non_zero_index = df.apply(lambda row: row.astype(bool).any(), axis=1).cumsum().idxmax()
-        #last_non_zero_index = df.apply(lambda row: any(row != 0), axis=1).cumsum().idxmax()
-
-        # df = df.iloc[:last_non_zero_index + 1]  # Include the last non-zero row
-        df = df.dropna()
-        #last_non_zero_index = (df!=0).any(axis=1).cumsum().idxmax() # Find the last non-zero row in the DataFrame
-
-        #df = df.iloc[:last_non_zero_index] # Remove all rows after the last non-zero row
+            weight_fractions = {element: 0.0 for element in elements}
+            for elem in q.composition.constituents:
+                element = f"{elem.Z}"[-2:]
+                if element in weight_fractions:
+                    weight_fractions[element] = elem.weightFraction
+            records.append((len(records), x, y, *(weight_fractions[element] for element in elements), temp))
+
+        df = pd.DataFrame.from_records(records, columns=["Particle No.", "x", "y", *elements, "Spec"])
 
         # Convert the weight fractions to atomic fractions and process the spectra
 
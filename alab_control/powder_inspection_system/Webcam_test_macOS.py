@@ -1,6 +1,8 @@
 import cv2
 import time
 import os
+import queue
+import threading
 import paramiko
 import scp
 from datetime import datetime
@@ -10,11 +12,14 @@ RESOLUTION = [1280, 720]
 period = 1
 num_pics = 1
 ADJUST = 0
-TIME_ADJUST = 0.047
 #time.sleep(5)
 cam = cv2.VideoCapture(0)
 cam.set(cv2.CAP_PROP_FRAME_WIDTH, RESOLUTION[0])
 cam.set(cv2.CAP_PROP_FRAME_HEIGHT,RESOLUTION[1])
+# Compressed stream and a single-frame buffer so cam.read() returns the current frame, not a stale queued one
+cam.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+cam.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+cam.set(cv2.CAP_PROP_FPS, 30)
 LOCAL_FOLDER_PATH = '/Users/CederALab/Desktop/Outputs/'
 
 # File Transter variables
@@ -24,31 +29,75 @@ IP = '128.3.19.55'
 PORT = 22  # Default SSH port
 PASSWORD = 'PassWord'
 
-def transfer_file_to_pc(local_path, remote_path, mac_username, mac_ip, mac_port, mac_password):
-    # Establish an SSH connection to the Mac
+def open_transport(mac_username, mac_ip, mac_port, mac_password):
+    # Establish an SSH connection to the Mac, reused for every file
     ssh = paramiko.SSHClient()
     ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
     ssh.connect(mac_ip, port=mac_port, username=mac_username, password=mac_password)
 
-    # Use SCP to copy the file from Raspberry Pi to Mac
-    with scp.SCPClient(ssh.get_transport()) as s:
-        s.put(local_path, remote_path)
-
-    # Close the SSH connection
-    ssh.close()
+    # SCP channel used to copy the files from Raspberry Pi to Mac
+    return ssh, scp.SCPClient(ssh.get_transport())
 
 num_pics = int(input("Please enter the number of pictures you want"))
 period = int(input("Please enter the period in seconds"))
 
-for i in range(ADJUST * -1, num_pics):
-    ret, image = cam.read()
-    if i >= 0:
-        cv2.imwrite(LOCAL_FOLDER_PATH + str(i) + '.jpg', image)
-        
-    time.sleep(period - TIME_ADJUST)
-    print(str(datetime.now()))
-cam.release()
-cv2.destroyAllWindows()
-
-for i in range(0, num_pics):
-    transfer_file_to_pc(LOCAL_FOLDER_PATH + str(i) + '.jpg', REMOTE_FOLDER_PATH + str(i) + '.jpg', USERNAME, IP, PORT, PASSWORD)
+# (local, remote) file path of every picture
+paths = [
+    (os.path.join(LOCAL_FOLDER_PATH, f"{i}.jpg"), os.path.join(REMOTE_FOLDER_PATH, f"{i}.jpg"))
+    for i in range(num_pics)
+]
+
+def write_frames(frame_queue, upload_queue):
+    # Encode and write frames off the capture thread so that disk I/O does not delay the next capture
+    try:
+        while True:
+            item = frame_queue.get()
+            if item is None:
+                break
+            i, image = item
+            if cv2.imwrite(paths[i][0], image, [cv2.IMWRITE_JPEG_QUALITY, 90]):
+                upload_queue.put(i)
+            else:
+                print(f"Failed to write frame {i}")
+    finally:
+        # Always release the uploader, even if writing failed
+        upload_queue.put(None)
+
+def upload_frames(upload_queue, s):
+    # Send each frame to the Mac as soon as it is on disk, while the capture is still running
+    while True:
+        i = upload_queue.get()
+        if i is None:
+            break
+        s.put(*paths[i])
+
+ssh, s = open_transport(USERNAME, IP, PORT, PASSWORD)
+frame_queue = queue.Queue(maxsize=max(num_pics, 1))
+upload_queue = queue.Queue()
+writer = threading.Thread(target=write_frames, args=(frame_queue, upload_queue))
+uploader = threading.Thread(target=upload_frames, args=(upload_queue, s))
+writer.start()
+uploader.start()
+
+try:
+    # Frame k is scheduled at t0 + k * period, so per-frame jitter never accumulates into drift
+    t0 = time.monotonic()
+    for i in range(ADJUST * -1, num_pics):
+        ret, image = cam.read()
+        if not ret:
+            print(f"Failed to capture frame {i}")
+        elif i >= 0:
+            frame_queue.put((i, image))
+        print(str(datetime.now()))
+        dt = t0 + (i + 1 + ADJUST) * period - time.monotonic()
+        if dt > 0:
+            time.sleep(dt)
+    cam.release()
+    cv2.destroyAllWindows()
+finally:
+    frame_queue.put(None)
+    writer.join()
+    uploader.join()
+    # Close the SCP channel and the SSH connection
+    s.close()
+    ssh.close()
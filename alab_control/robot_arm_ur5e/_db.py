@@ -0,0 +1,36 @@
+"""
+The MongoDB client shared by the robot arm scripts, so that they reuse one connection pool
+instead of each opening its own client at import. Importing this module does not touch the
+network; the scripts call ``ensure_indexes`` before using the collection.
+"""
+
+import importlib.util
+
+import pymongo
+
+
+def _available_compressors() -> str:
+    """
+    The wire compressors whose package is installed, in order of preference; zlib is part of the stdlib
+    """
+    compressors = []
+    for name, module in (("zstd", "zstandard"), ("snappy", "snappy")):
+        if importlib.util.find_spec(module) is not None:
+            compressors.append(name)
+    compressors.append("zlib")
+    return ",".join(compressors)
+
+
+# waypoint documents are mostly doubles and compress well
+_client = pymongo.MongoClient(maxPoolSize=20, minPoolSize=1, serverSelectionTimeoutMS=2000,
+                              compressors=_available_compressors(), zlibCompressionLevel=6)
+
+program_collection = _client["robot_arm"]["program"]
+
+
+def ensure_indexes():
+    """
+    Create the indexes the scripts rely on (a no-op if they exist). Every lookup and upsert is keyed on
+    the program name, and the index turns those into B-tree probes.
+    """
+    program_collection.create_index("name", unique=True)
@@ -1,22 +1,66 @@
-import copy
-import json
-import time
+import functools
 from pathlib import Path
-from pprint import pprint
-from random import shuffle
 from traceback import print_exc
 
-import pymongo
-from jinja2 import Environment, FileSystemLoader, StrictUndefined
-
-program_collection = pymongo.MongoClient()["robot_arm"]["program"]
-
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, StrictUndefined
+
+from alab_control.robot_arm_ur5e._db import ensure_indexes, program_collection
+
+# one environment per module, so that templates are loaded and compiled only once.
+# Templates are not edited while the robot runs, so skip the mtime check on every lookup; URScript is not
+# markup, so nothing is escaped, and the cache is sized well above the number of templates and includes.
+_ENV = Environment(loader=FileSystemLoader((Path(__file__).parent / "templates").as_posix()),
+                   extensions=["jinja2_workarounds.MultiLineInclude"], undefined=StrictUndefined,
+                   auto_reload=False, autoescape=False, cache_size=128,
+                   # compiled templates are kept on disk, so a fresh process does not recompile them
+                   bytecode_cache=FileSystemBytecodeCache())
+
+
+def _positions_by_name(field):
+    """
+    Aggregation expression turning a list of named positions into ``{name: {"pose": ..., "joint": ...}}``,
+    leaving the field out if the document does not have it
+    """
+    return {"$cond": [
+        {"$isArray": f"${field}"},
+        {"$arrayToObject": {"$map": {
+            "input": f"${field}",
+            "as": "p",
+            "in": {"k": "$$p.name", "v": {"pose": "$$p.pose", "joint": "$$p.joint"}},
+        }}},
+        "$$REMOVE",
+    ]}
+
+
+# shapes a program document server-side into exactly the pieces used by the script generators
+_PROGRAM_PROJECTION = {"$project": {
+    "_id": 0,
+    "start_pose": "$initial_position.pose",
+    "start_qnear": "$initial_position.joint",
+    "home_mid_poses": "$home_trans.pose",
+    "home_mid_qnears": "$home_trans.joint",
+    "trans_poses": "$transition_waypoints.pose",
+    "trans_qnears": "$transition_waypoints.joint",
+    "start_positions": _positions_by_name("start_positions"),
+    "end_positions": _positions_by_name("end_positions"),
+}}
+
+
+@functools.lru_cache(maxsize=32)
+def _load_program(name):
+    """
+    Fetch a program document, shaped into the pieces used by the script generators with the start/end
+    positions indexed by name. The result is cached by name, call ``_load_program.cache_clear()`` and
+    ``_proto_config.cache_clear()`` after the waypoints of a program are redefined.
+    """
+    program = next(program_collection.aggregate([{"$match": {"name": name}}, _PROGRAM_PROJECTION]), None)
+    if program is None:
+        raise ValueError(f"No program named {name}")
+    return program
 
 def generate_home_urscript(template_name="home.script", name="initial_rack_to_box_furnace_rack_1",
                            go_home=True, gripper_model="hande", robot_model="ur5e"):
-    env = Environment(loader=FileSystemLoader((Path(__file__).parent / "templates").as_posix()),
-                      extensions=["jinja2_workarounds.MultiLineInclude"], undefined=StrictUndefined)
-    template = env.get_template(template_name)
+    template = _ENV.get_template(template_name)
 
     config = {
         "go_home": go_home,
@@ -24,63 +68,65 @@ def generate_home_urscript(template_name="home.script", name="initial_rack_to_bo
         "robot_model": robot_model,
     }
 
-    program_doc = program_collection.find_one({"name": name})
+    program = _load_program(name)
 
-    config["home_mid_poses"] = [pos["pose"] for pos in program_doc["home_trans"]]
-    config["home_mid_qnears"] = [pos["joint"] for pos in program_doc["home_trans"]]
+    config["home_mid_poses"] = program["home_mid_poses"]
+    config["home_mid_qnears"] = program["home_mid_qnears"]
 
-    config["start_pose"] = program_doc["initial_position"]["pose"]
-    config["start_qnear"] = program_doc["initial_position"]["joint"]
+    config["start_pose"] = program["start_pose"]
+    config["start_qnear"] = program["start_qnear"]
 
     script = template.render(**config)
 
     return script
 
 
-def generate_urscript(from_, to_,
-                      template_name="pick_place.script",
-                      name="initial_rack_to_box_furnace_rack_1",
-                      approach_distance_mm=60,
-                      # speed_factor=1.,
-                      gripper_model="hande",
-                      robot_model="ur5e",
-
-                      for_local=False):
-    env = Environment(loader=FileSystemLoader((Path(__file__).parent / "templates").as_posix()),
-                      extensions=["jinja2_workarounds.MultiLineInclude"], undefined=StrictUndefined)
-    template = env.get_template(template_name)
-
-    config = {
+@functools.lru_cache(maxsize=16)
+def _proto_config(name, approach_distance_mm, gripper_model, robot_model):
+    """
+    The part of the pick-place config that is the same for every position pair of a program
+    """
+    program = _load_program(name)
+    return {
         "speed": 0.3,
         "approach_distance_mm": approach_distance_mm,
         "gripper_model": gripper_model,
         "robot_model": robot_model,
+        "start_pose": program["start_pose"],
+        "start_qnear": program["start_qnear"],
+        "trans_poses": program["trans_poses"],
+        "trans_qnears": program["trans_qnears"],
     }
 
-    program_doc = program_collection.find_one({"name": name})
 
-    config["start_pose"] = program_doc["initial_position"]["pose"]
-    config["start_qnear"] = program_doc["initial_position"]["joint"]
+def _urscript_config(from_, to_, name, approach_distance_mm, gripper_model, robot_model):
+    config = _proto_config(name, approach_distance_mm, gripper_model, robot_model).copy()
 
-    config["trans_poses"] = [pos["pose"] for pos in program_doc["transition_waypoints"]]
-    config["trans_qnears"] = [pos["joint"] for pos in program_doc["transition_waypoints"]]
+    program = _load_program(name)
+    config["pick_pose"] = program["start_positions"][from_]["pose"]
+    config["pick_qnear"] = program["start_positions"][from_]["joint"]
 
-    start_positions = {pos["name"]: {"pose": pos["pose"], "joint": pos["joint"]}
-                       for pos in program_doc["start_positions"]}
-    config["pick_pose"] = start_positions[from_]["pose"]
-    config["pick_qnear"] = start_positions[from_]["joint"]
+    config["place_pose"] = program["end_positions"][to_]["pose"]
+    config["place_qnear"] = program["end_positions"][to_]["joint"]
+    return config
 
-    end_positions = {pos["name"]: {"pose": pos["pose"], "joint": pos["joint"]}
-                     for pos in program_doc["end_positions"]}
-    config["place_pose"] = end_positions[to_]["pose"]
-    config["place_qnear"] = end_positions[to_]["joint"]
+def generate_urscript(from_, to_,
+                      template_name="pick_place.script",
+                      name="initial_rack_to_box_furnace_rack_1",
+                      approach_distance_mm=60,
+                      # speed_factor=1.,
+                      gripper_model="hande",
+                      robot_model="ur5e",
+
+                      for_local=False):
+    template = _ENV.get_template(template_name)
+    config = _urscript_config(from_, to_, name, approach_distance_mm, gripper_model, robot_model)
 
     script = template.render(**config)
 
     if for_local:
-        script = script.split("\n")
-        script = [line for line in script if not line.strip(" ").startswith("$")]
-        script = "\n".join(script) + "\n\nunnamed()\n"
+        script = "\n".join(line for line in script.split("\n") if not line.lstrip(" ").startswith("$")) \
+                 + "\n\nunnamed()\n"
     return script
 
 
@@ -90,6 +136,7 @@ if __name__ == '__main__':
 
     import urx
 
+    ensure_indexes()
     robot = urx.Robot("192.168.0.23")
 
     try:
@@ -107,15 +154,12 @@ if __name__ == '__main__':
         #
         # exit(0)
 
-        i = input("Enter the approach distance (mm): ")
+        approach_distance_mm = float(input("Enter the approach distance (mm): "))
+        gripper_open_mm = float(input("Enter gripper open distance (mm): "))
         program_collection.update_one({"name": name}, {"$set": {
-            "approach_distance_mm": float(i),
+            "approach_distance_mm": approach_distance_mm,
             "type": type_,
-        }}, upsert=True)
-
-        i = input("Enter gripper open distance (mm): ")
-        program_collection.update_one({"name": name}, {"$set": {
-            "gripper_open_mm": float(i),
+            "gripper_open_mm": gripper_open_mm,
         }}, upsert=True)
 
         input("Press Enter to set start point:")
@@ -126,25 +170,34 @@ if __name__ == '__main__':
             "joint": robot.getj(),
         }}}, upsert=True)
         
+        # the waypoints are collected locally and written in one round trip
+        transition_waypoints = []
         i = input("Press Enter to set trans, press -1 to stop:")
         while i != "-1":
-            program_collection.update_one({
-                "name": name
-            }, {"$push": {"transition_waypoints": {
+            transition_waypoints.append({
                 "pose": robot.getl(),
                 "joint": robot.getj(),
-            }}}, upsert=True)
+            })
             i = input("Press Enter to set trans, press -1 to stop:")
 
+        pick_positions = []
         for pos in range(1, 21):
             input(f"Press enter to set position for {pos}:")
-            program_collection.update_one({
-                "name": name
-            }, {"$push": {"pick_position": {
+            pick_positions.append({
                 "name": f"{pos}",
                 "pose": robot.getl(),
                 "joint": robot.getj(),
-            }}}, upsert=True)
+            })
+
+        program_collection.update_one({
+            "name": name
+        }, {"$push": {
+            "transition_waypoints": {"$each": transition_waypoints},
+            "pick_position": {"$each": pick_positions},
+        }}, upsert=True)
+        # the waypoints of this program were just redefined
+        _load_program.cache_clear()
+        _proto_config.cache_clear()
 
         # i = input("Press Enter to set trans, press -1 to stop:")
         # while i != "-1":
@@ -1,14 +1,96 @@
-import json
+import functools
 import socket
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Callable, List, Dict, Literal, Optional, Union
+from typing import Callable, FrozenSet, List, Dict, Literal, Optional, Tuple, Union
 
-from jinja2 import Environment, FileSystemLoader, StrictUndefined
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, StrictUndefined
 import numpy as np
 
 from alab_control.robot_arm_ur5e import URRobotDashboard, URRobotSecondary
 from alab_control.robot_arm_ur5e.ur_robot_ssh import URRobotSSH
 
+try:
+    from orjson import loads as _json_loads
+except ImportError:  # orjson is optional, the stdlib parser reads the same utf-8 bytes
+    from json import loads as _json_loads
+
+_JINJA_ENV: Optional[Environment] = None
+
+
+def _get_jinja_env() -> Environment:
+    """
+    The Jinja environment shared by all the robot arms in this process, so that each template is
+    compiled once. The templates only render, so sharing them between instances is safe.
+    """
+    global _JINJA_ENV
+    if _JINJA_ENV is None:
+        _JINJA_ENV = Environment(
+            loader=FileSystemLoader((Path(__file__).parent / "templates").as_posix()),
+            undefined=StrictUndefined,
+            # drop the newlines and indentation left by block tags, which shortens the script sent to the arm
+            trim_blocks=True,
+            lstrip_blocks=True,
+            # the templates do not change while the robot runs: never evict them, never stat them again
+            auto_reload=False,
+            cache_size=-1,
+            # compiled templates are kept on disk, so a fresh process does not recompile them
+            bytecode_cache=FileSystemBytecodeCache(),
+        )
+    return _JINJA_ENV
+
+
+def _as_joints(joints: Union[List[float], np.ndarray]) -> np.ndarray:
+    """
+    Coerce the joint angles into one contiguous float64 array of the six joints
+    """
+    joints = np.ascontiguousarray(joints, dtype=np.float64)
+    if joints.shape != (6,):
+        raise ValueError(f"The joints should have 6 elements, but got shape {joints.shape}.")
+    return joints
+
+
+def _gather_clients(futures: List[Future]) -> list:
+    """
+    Collect the clients connected concurrently, in the order of ``futures``. If any connection failed,
+    the clients that did connect are closed before its error is re-raised, so no socket or thread leaks.
+    """
+    clients = []
+    error = None
+    for future in futures:
+        try:
+            clients.append(future.result())
+        except Exception as e:
+            if error is None:
+                error = e
+    if error is not None:
+        for client in clients:
+            client.close()
+        raise error
+    return clients
+
+
+@functools.lru_cache(maxsize=None)
+def _load_dummy_waypoints() -> List[Dict]:
+    """
+    Load ``waypoints/dummy.json`` once per process. The file is read-only at runtime, so all the
+    Dummy instances share the parsed list; it is annotated with lookups used on every move:
+    the position names reachable by each waypoint, used to pick the waypoint in move_crucibles,
+    and the positions indexed by name and the pose/joint lists.
+    """
+    waypoints = _json_loads((Path(__file__).parent / "waypoints" / "dummy.json").read_bytes())
+    for waypoint in waypoints:
+        waypoint["_start_names"] = frozenset(pos["name"] for pos in waypoint["start_positions"])
+        waypoint["_end_names"] = frozenset(pos["name"] for pos in waypoint["end_positions"])
+        waypoint["_start_map"] = {pos["name"]: pos for pos in waypoint["start_positions"]}
+        waypoint["_end_map"] = {pos["name"]: pos for pos in waypoint["end_positions"]}
+        waypoint["_trans_poses"] = [pos["pose"] for pos in waypoint["transition_waypoints"]]
+        waypoint["_trans_qnears"] = [pos["joint"] for pos in waypoint["transition_waypoints"]]
+        if "home_trans" in waypoint:
+            waypoint["_home_poses"] = [pos["pose"] for pos in waypoint["home_trans"]]
+            waypoint["_home_qnears"] = [pos["joint"] for pos in waypoint["home_trans"]]
+    return waypoints
+
 
 class BaseURRobot:
     """
@@ -17,11 +99,25 @@ class BaseURRobot:
 
     HEADER_FILE_NAME = "empty.script"
 
-    def __init__(self, ip_address: str, use_secondary: bool = False) -> None:
+    def __init__(self, ip_address: str, use_secondary: bool = False, tcp_nodelay: bool = True) -> None:
         self.ip_address = ip_address
-        self.ssh = URRobotSSH(ip=ip_address)
-        self.secondary = URRobotSecondary(ip=ip_address) if use_secondary else None
-        self.dashboard = URRobotDashboard(ip=ip_address)
+        # the connections are independent, so their handshakes run concurrently
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            ssh = executor.submit(URRobotSSH, ip=ip_address)
+            secondary = executor.submit(
+                URRobotSecondary, ip=ip_address, tcp_nodelay=tcp_nodelay
+            ) if use_secondary else None
+            dashboard = executor.submit(URRobotDashboard, ip=ip_address, tcp_nodelay=tcp_nodelay)
+        if secondary is not None:
+            self.ssh, self.secondary, self.dashboard = _gather_clients([ssh, secondary, dashboard])
+        else:
+            self.ssh, self.dashboard = _gather_clients([ssh, dashboard])
+            self.secondary = None
+        self._fmt_handlers: Dict[str, Callable[[str, bool], None]] = {
+            "urp_path": self._run_urp,
+            "urscript_path": self._run_urscript_path,
+            "urscript": self._run_urscript,
+        }
 
     def run_program(
             self,
@@ -44,38 +140,45 @@ class BaseURRobot:
             block: the function will wait until the program is finished.
         """
         if fmt is None:
-            if program.endswith(".urp"):
-                fmt = "urp_path"
-            elif program.endswith(".script"):
-                fmt = "urscript_path"
-            elif program.startswith("def"):
-                fmt = "urscript"
-            else:
+            fmt = (
+                "urp_path" if program.endswith(".urp")
+                else "urscript_path" if program.endswith(".script")
+                else "urscript" if program.startswith("def")
+                else None
+            )
+            if fmt is None:
                 raise ValueError(
                     "Cannot infer the format from the program string. "
                     "Please specifiy the fmt manually."
                 )
 
+        handler = self._fmt_handlers.get(fmt)
+        if handler is None:
+            raise ValueError(
+                f"Unknown fmt value: {fmt}. "
+                "Currently we support ['urp_path', 'urscript', 'urscript_path']."
+            )
+
         if fmt.startswith("urscript") and self.secondary is None:
             raise ValueError(
                 "Cannot run urscript program when the secondary interface is not "
                 "enabled. Set `use_secondary=True` when initializing the robot arm."
             )
 
-        if fmt == "urp_path":
-            self.dashboard.run_program(program, block=block)
-        elif fmt == "urscript_path":
-            program_content = self.ssh.read_program(
-                program, header_file_name=self.HEADER_FILE_NAME
-            )
-            self.secondary.run_program(program_content, block=block)
-        elif fmt == "urscript":
-            self.secondary.run_program(program, block=block)
-        else:
-            raise ValueError(
-                f"Unknown fmt value: {fmt}. "
-                "Currently we support ['urp_path', 'urscript', 'urscript_path']."
-            )
+        handler(program, block)
+
+    def _run_urp(self, program: str, block: bool):
+        self.dashboard.run_program(program, block=block)
+
+    def _run_urscript_path(self, program: str, block: bool):
+        # URRobotSSH only downloads the program again when it was changed on the robot arm
+        program_content = self.ssh.read_program(
+            program, header_file_name=self.HEADER_FILE_NAME
+        )
+        self.secondary.run_program(program_content, block=block)
+
+    def _run_urscript(self, program: str, block: bool):
+        self.secondary.run_program(program, block=block)
 
     def run_programs(self, programs: List[Union[str, Callable[[], None]]]):
         """
@@ -86,16 +189,13 @@ class BaseURRobot:
             programs: The programs can be (1) a program string that will be sent to the ``run_program``;
               (2) a callable that have not arguments, it will be called
         """
-        # do something type check first
-        for program in programs:
-            if not isinstance(program, str) and not callable(program):
-                raise ValueError(f"Expect str or a callable, but get {type(program)}")
-
         for program in programs:
             if isinstance(program, str):
                 self.run_program(program=program, block=True)
-            else:
+            elif callable(program):
                 program()
+            else:
+                raise ValueError(f"Expect str or a callable, but get {type(program)}")
 
     def set_speed(self, speed: float):
         """
@@ -104,8 +204,10 @@ class BaseURRobot:
         if not 0 <= speed <= 1:
             raise ValueError("The speed should be a value between 0 and 1.")
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            # the command is a single small packet, do not let Nagle hold it back waiting for an ack
+            s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             s.connect((self.ip_address, 30003))
-            s.send(f"set speed {speed}\n".encode())
+            s.sendall(f"set speed {speed}\n".encode())
 
     def is_running(self) -> bool:
         """
@@ -137,7 +239,7 @@ class BaseURRobot:
                 "enabled. Set `use_secondary=True` when initializing the robot arm."
             )
         self.secondary.movej(
-            joints, acc=acc, vel=vel, wait=wait, relative=relative, threshold=threshold
+            _as_joints(joints), acc=acc, vel=vel, wait=wait, relative=relative, threshold=threshold
         )
 
     def check_joints(self, target_joints: Union[List[float], np.ndarray]):
@@ -149,7 +251,7 @@ class BaseURRobot:
                 "Cannot run movej program when the secondary interface is not "
                 "enabled. Set `use_secondary=True` when initializing the robot arm."
             )
-        return self.secondary.check_joints(target_joints=target_joints)
+        return self.secondary.check_joints(target_joints=_as_joints(target_joints))
 
     def clear_popup(self):
         """
@@ -179,25 +281,33 @@ class Dummy:
         "rack_c": "BFRACK_C",
         "rack_d": "BFRACK_D",
     }
+    _valid_racks = frozenset(racks_positions)
 
     def __init__(self, ip):
         self.robot_type = "hande_ur5e"
-        self._dashboard_client = URRobotDashboard(
-            ip
-        )  # dashboard client is used for reading status from the robot arm
-        # secondary client is used for sending the programs to the robot arm
-        self._secondary_client = URRobotSecondary(ip)
-        self._ssh_client = URRobotSSH(
-            ip
-        )  # ssh client is used for reading programs from the robot arm
-        self.waypoints = json.load(
-            (Path(__file__).parent / "waypoints" / "dummy.json").open(encoding="utf-8")
+        # the three connections are independent, so their handshakes run concurrently
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            dashboard_client = executor.submit(URRobotDashboard, ip)
+            secondary_client = executor.submit(URRobotSecondary, ip)
+            ssh_client = executor.submit(URRobotSSH, ip)
+        # dashboard client is used for reading status from the robot arm,
+        # secondary client is used for sending the programs to the robot arm,
+        # ssh client is used for reading programs from the robot arm
+        self._dashboard_client, self._secondary_client, self._ssh_client = _gather_clients(
+            [dashboard_client, secondary_client, ssh_client]
         )
-        self.jinja_env = Environment(
-            loader=FileSystemLoader((Path(__file__).parent / "templates").as_posix()),
-            extensions=["jinja2_workarounds.MultiLineInclude"],
-            undefined=StrictUndefined,
+        # pull all the rack scripts in one go to warm the read cache of the ssh client,
+        # later reads only download a script again if it was edited on the robot arm
+        self._ssh_client.prefetch_programs(
+            ["Pick_Handle.script", "Place_Handle.script", "Home.script"]
+            + [f"{action}_{rack}.script" for rack in self.racks_positions.values() for action in ("Pick", "Place")]
         )
+        self.waypoints = _load_dummy_waypoints()
+        self._waypoint_index: Dict[Tuple[FrozenSet[str], FrozenSet[str]], Optional[Dict]] = {}
+        self.jinja_env = _get_jinja_env()
+        # the templates are looked up once and rendered for every move
+        self._home_trans_template = self.jinja_env.get_template("home_trans.script")
+        self._pick_place_template = self.jinja_env.get_template("pick_place.script")
 
     def is_running(self):
         return self._dashboard_client.is_running()
@@ -212,106 +322,109 @@ class Dummy:
             raise ValueError("Robot arm is not in remote mode")
 
     def move_rack(self, start: str, end: str):
+        # bad rack names fail here, before any traffic to the robot arm
+        invalid = {start, end} - self._valid_racks
+        if invalid:
+            raise ValueError(f"{', '.join(sorted(invalid))} is not a valid rack position")
         self.check_status()
-        if start not in self.racks_positions.keys():
-            raise ValueError(f"{start} is not a valid rack position")
-        if end not in self.racks_positions.keys():
-            raise ValueError(f"{end} is not a valid rack position")
+
+        script_names = [
+            "Pick_Handle.script",
+            f"Pick_{self.racks_positions[start]}.script",
+            f"Place_{self.racks_positions[end]}.script",
+            "Place_Handle.script",
+            "Home.script",
+        ]
+        # fetch the scripts up front over one sftp session; unchanged scripts only cost a stat
+        scripts = self._ssh_client.read_programs(script_names)
 
         self._secondary_client.set_speed(0.4)
-        self._secondary_client.run_program(
-            self._ssh_client.read_program("Pick_Handle.script"), block=True
-        )
-        self._secondary_client.run_program(
-            self._ssh_client.read_program(f"Pick_{self.racks_positions[start]}.script"),
-            block=True,
-        )
-        self._secondary_client.run_program(
-            self._ssh_client.read_program(f"Place_{self.racks_positions[end]}.script"),
-            block=True,
-        )
-        self._secondary_client.run_program(
-            self._ssh_client.read_program("Place_Handle.script"), block=True
-        )
-        self._secondary_client.run_program(
-            self._ssh_client.read_program("Home.script"), block=True
-        )
+        for name in script_names:
+            self._secondary_client.run_program(scripts[name], block=True)
 
     def _home_trans(self, waypoint_doc: Dict, go_home: bool):
         home_trans_config = {
             "go_home": go_home,
             "robot_type": self.robot_type,
-            "home_mid_poses": [pos["pose"] for pos in waypoint_doc["home_trans"]],
-            "home_mid_qnears": [pos["joint"] for pos in waypoint_doc["home_trans"]],
+            "home_mid_poses": waypoint_doc["_home_poses"],
+            "home_mid_qnears": waypoint_doc["_home_qnears"],
             "start_pose": waypoint_doc["initial_position"]["pose"],
             "start_qnear": waypoint_doc["initial_position"]["joint"],
         }
 
-        home_trans_template = self.jinja_env.get_template("home_trans.script")
-        script = home_trans_template.render(**home_trans_config)
+        script = self._home_trans_template.render(**home_trans_config)
         self._secondary_client.run_program(script, block=True)
 
     def _pick_place(self, start: str, end: str, waypoint_doc: Dict):
-        start_positions = {
-            pos["name"]: {"pose": pos["pose"], "joint": pos["joint"]}
-            for pos in waypoint_doc["start_positions"]
-        }
+        script = self._render_pick_place(start=start, end=end, waypoint_doc=waypoint_doc)
+        self._secondary_client.run_program(script, block=True)
 
-        end_positions = {
-            pos["name"]: {"pose": pos["pose"], "joint": pos["joint"]}
-            for pos in waypoint_doc["end_positions"]
-        }
+    def _render_pick_place(self, start: str, end: str, waypoint_doc: Dict) -> str:
+        start_position = waypoint_doc["_start_map"][start]
+        end_position = waypoint_doc["_end_map"][end]
         pick_place_config = {
             "robot_type": self.robot_type,
             "approach_distance_mm": waypoint_doc["approach_distance_mm"],
             "start_pose": waypoint_doc["initial_position"]["pose"],
             "start_qnear": waypoint_doc["initial_position"]["joint"],
-            "pick_pose": start_positions[start]["pose"],
-            "pick_qnear": start_positions[start]["joint"],
-            "trans_poses": [
-                pos["pose"] for pos in waypoint_doc["transition_waypoints"]
-            ],
-            "trans_qnears": [
-                pos["joint"] for pos in waypoint_doc["transition_waypoints"]
-            ],
-            "place_pose": end_positions[end]["pose"],
-            "place_qnear": end_positions[end]["joint"],
+            "pick_pose": start_position["pose"],
+            "pick_qnear": start_position["joint"],
+            "trans_poses": waypoint_doc["_trans_poses"],
+            "trans_qnears": waypoint_doc["_trans_qnears"],
+            "place_pose": end_position["pose"],
+            "place_qnear": end_position["joint"],
         }
 
-        pick_place_template = self.jinja_env.get_template("pick_place.script")
-        script = pick_place_template.render(**pick_place_config)
-        self._secondary_client.run_program(script, block=True)
+        return self._pick_place_template.render(**pick_place_config)
+
+    def _find_waypoint(self, starts: FrozenSet[str], ends: FrozenSet[str]) -> Optional[Dict]:
+        """
+        The first waypoint reaching all the starts and ends, remembered per (starts, ends) pair
+        """
+        key = (starts, ends)
+        if key not in self._waypoint_index:
+            self._waypoint_index[key] = next(
+                (waypoint for waypoint in self.waypoints
+                 if waypoint["_start_names"] >= starts and waypoint["_end_names"] >= ends),
+                None,
+            )
+        return self._waypoint_index[key]
 
     def move_crucibles(self, starts: List[str], ends: List[str]):
-        self.check_status()
+        # the positions are checked against the waypoints before any traffic to the robot arm
+        starts_set = frozenset(starts)
+        ends_set = frozenset(ends)
         if len(starts) != len(ends):
             raise ValueError("The number of starts and ends must be the same")
-        if len(set(starts)) != len(starts):
+        if len(starts_set) != len(starts):
             raise ValueError("There are duplicate starts")
-        if len(set(ends)) != len(ends):
+        if len(ends_set) != len(ends):
             raise ValueError("There are duplicate ends")
 
-        if not starts or not ends:
+        waypoint_to_use = None
+        if starts:
+            waypoint_to_use = self._find_waypoint(starts_set, ends_set)
+            if waypoint_to_use is None:
+                raise ValueError(f"No waypoint found from {starts} to {ends}")
+
+        self.check_status()
+        if not starts:
             return
         self._secondary_client.set_speed(0.8)
 
-        waypoint_to_use = None
-
-        for waypoint in self.waypoints:
-            if set(pos["name"] for pos in waypoint["start_positions"]).issuperset(
-                    set(starts)
-            ) and set(pos["name"] for pos in waypoint["end_positions"]).issuperset(
-                set(ends)
-            ):
-                waypoint_to_use = waypoint
-                break
-
-        if waypoint_to_use is None:
-            raise ValueError(f"No waypoint found from {starts} to {ends}")
-
-        self._home_trans(waypoint_doc=waypoint_to_use, go_home=False)
-        for start, end in zip(starts, ends):
-            self._pick_place(start=start, end=end, waypoint_doc=waypoint_to_use)
+        # the next pick-place script is rendered while the robot arm runs the current one
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            next_script = executor.submit(
+                self._render_pick_place, start=starts[0], end=ends[0], waypoint_doc=waypoint_to_use
+            )
+            self._home_trans(waypoint_doc=waypoint_to_use, go_home=False)
+            for i in range(len(starts)):
+                script = next_script.result()
+                if i + 1 < len(starts):
+                    next_script = executor.submit(
+                        self._render_pick_place, start=starts[i + 1], end=ends[i + 1], waypoint_doc=waypoint_to_use
+                    )
+                self._secondary_client.run_program(script, block=True)
         self._home_trans(waypoint_doc=waypoint_to_use, go_home=True)
 
     def close(self):
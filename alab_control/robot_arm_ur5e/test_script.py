@@ -2,13 +2,12 @@ from pathlib import Path
 
 from sympy import root
 
+from alab_control.robot_arm_ur5e._db import program_collection
 from alab_control.robot_arm_ur5e.robots import CharDummy
 from alab_control.robot_arm_ur5e.utils import get_header, replace_header, make_template_config
-import pymongo
 from jinja2 import Environment, FileSystemLoader, StrictUndefined
 
-db = pymongo.MongoClient()["robot_arm"]
-program = db["program"]
+program = program_collection
 
 robot = CharDummy("192.168.0.23")
 robot.set_speed(1)
@@ -47,8 +46,9 @@ if __name__ == "__main__":
     #     program = replace_header(place_template.render(**config), header)
     #     robot.run_program(program)     
 
-    rack_c = program.find_one({"name": "vial_rack_B"})
-    dumping = program.find_one({"name": "dumping_station"})
+    docs = {doc["name"]: doc for doc in program.find({"name": {"$in": ["vial_rack_B", "dumping_station"]}})}
+    rack_c = docs["vial_rack_B"]
+    dumping = docs["dumping_station"]
     env = Environment(loader=FileSystemLoader((Path(__file__).parent / "templates").as_posix()),
                       extensions=["jinja2_workarounds.MultiLineInclude"], undefined=StrictUndefined)
     place_template = env.get_template("place.script")
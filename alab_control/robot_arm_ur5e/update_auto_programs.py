@@ -1,13 +1,14 @@
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from typing import List
 from xml.sax.saxutils import escape
 
-import pymongo
 from jinja2 import Environment, FileSystemLoader, StrictUndefined
 
+from alab_control.robot_arm_ur5e._db import ensure_indexes, program_collection as programs_collection
 from alab_control.robot_arm_ur5e.robots import CharDummy
-from alab_control.robot_arm_ur5e.utils import make_template_config
-
-programs_collection = pymongo.MongoClient()["robot_arm"]["program"]
+from alab_control.robot_arm_ur5e.utils import fill_position, make_template_base
 
 env = Environment(loader=FileSystemLoader((Path(__file__).parent / "templates").as_posix()),
                   extensions=["jinja2_workarounds.MultiLineInclude"], undefined=StrictUndefined)
@@ -18,40 +19,79 @@ urp_template = env.get_template("urp_template")
 robot = CharDummy("192.168.0.23")
 
 
+# a whole label line ("$ 1 ..."), including its newline
+_LABEL_RE = re.compile(r"^[^\S\n]*\$.*(?:\n|\Z)", re.MULTILINE)
+
+
 def remove_urscript_label(urscript: str) -> str:
-    urscript_lines = urscript.splitlines()
-    urscript_lines = [line for line in urscript_lines if not line.strip().startswith("$")]
-    return "\n".join(urscript_lines)
-
-
-for program_doc in programs_collection.find({}):
-    position_names = [pick_position["name"] for pick_position in program_doc["pick_position"]]
-    for position_name in position_names:
-        config = make_template_config(program_doc, position_name)
-        
-        name = f"pick_{program_doc['name']}" + (f"_{position_name}" if len(position_names) > 1 else "")
-        config["name"] = name
-        pick_program = pick_template.render(**config)
-        pick_program = remove_urscript_label(pick_program)
-        robot.ssh.write_program(name + ".auto.script", pick_program)
-
-        urp_program = urp_template.render({
-            "program_name": name,
-            "program_path": "/programs/" + name + ".auto.script",
-            "program_string": escape(pick_program),
-        })
-        robot.ssh.compress_write_program(name + ".auto.urp", urp_program)
-        print(name)
-
-        name = f"place_{program_doc['name']}" + (f"_{position_name}" if len(position_names) > 1 else "")
-        config["name"] = name
-        place_program = place_template.render(**config)
-        place_program = remove_urscript_label(place_program)
-        robot.ssh.write_program(name + ".auto.script", place_program)
-
-        urp_program = urp_template.render({
-            "program_path": "/programs/" + name + ".auto.script",
-            "program_string": escape(place_program),
-        })
-        robot.ssh.compress_write_program(name + ".auto.urp", urp_program)
-        print(name)
+    urscript = _LABEL_RE.sub("", urscript)
+    # like splitlines + join, the script does not end with a newline
+    return urscript[:-1] if urscript.endswith("\n") else urscript
+
+
+# only the fields used to render the programs
+_PROGRAM_FIELDS = {
+    "_id": 0,
+    "name": 1,
+    "approach_distance_mm": 1,
+    "gripper_open_mm": 1,
+    "start_pos": 1,
+    "transition_waypoints": 1,
+    "pick_position": 1,
+}
+
+
+def process_position(program_name: str, base_config, pick_positions, position_name: str, suffix: str) -> List[str]:
+    """
+    Render and upload the pick and the place program (script and urp) of one position,
+    returning the names of the uploaded programs
+    """
+    config = fill_position(base_config, position_name, pick_positions)
+
+    name = f"pick_{program_name}" + suffix
+    config["name"] = name
+    pick_program = pick_template.render(**config)
+    pick_program = remove_urscript_label(pick_program)
+    robot.ssh.write_program(name + ".auto.script", pick_program)
+
+    urp_program = urp_template.render({
+        "program_name": name,
+        "program_path": "/programs/" + name + ".auto.script",
+        "program_string": escape(pick_program),
+    })
+    robot.ssh.compress_write_program(name + ".auto.urp", urp_program)
+    pick_name = name
+
+    name = f"place_{program_name}" + suffix
+    config["name"] = name
+    place_program = place_template.render(**config)
+    place_program = remove_urscript_label(place_program)
+    robot.ssh.write_program(name + ".auto.script", place_program)
+
+    urp_program = urp_template.render({
+        "program_path": "/programs/" + name + ".auto.script",
+        "program_string": escape(place_program),
+    })
+    robot.ssh.compress_write_program(name + ".auto.urp", urp_program)
+    return [pick_name, name]
+
+
+ensure_indexes()
+
+# the positions are independent, so their rendering and uploads overlap; each worker thread
+# uploads over its own sftp channel of the robot's ssh connection
+with ThreadPoolExecutor(max_workers=8) as executor:
+    futures = []
+    for program_doc in programs_collection.find({}, _PROGRAM_FIELDS, batch_size=100):
+        position_names = [pick_position["name"] for pick_position in program_doc["pick_position"]]
+        base_config = make_template_base(program_doc)
+        pick_positions = {pos["name"]: pos for pos in program_doc["pick_position"]}
+        for position_name in position_names:
+            futures.append(executor.submit(
+                process_position, program_doc["name"], base_config, pick_positions, position_name,
+                f"_{position_name}" if len(position_names) > 1 else "",
+            ))
+
+    for future in as_completed(futures):
+        for name in future.result():
+            print(name)
@@ -12,6 +12,7 @@ from typing import Optional
 
 from alab_control.robot_arm_ur5e.program_list import PREDEFINED_PROGRAM
 from alab_control.robot_arm_ur5e.ur_robot_primary import URRobotPrimary
+from alab_control.robot_arm_ur5e.utils import configure_socket
 
 logger = logging.getLogger(__name__)
 
@@ -72,7 +73,7 @@ class URRobotDashboard:
     for commands' instructions
     """
 
-    def __init__(self, ip: str, timeout: float = 5):
+    def __init__(self, ip: str, timeout: float = 5, tcp_nodelay: bool = True):
         """
         The dashboard interface to UR Robot
         It will also initialize a primary interface to monitor the popup in the robot arm.
@@ -81,17 +82,19 @@ class URRobotDashboard:
             ip: the ip address to the UR Robot
             port: port of socket
             timeout: timeout time in sec
+            tcp_nodelay: disable Nagle's algorithm on the sockets, so commands are not delayed
         """
         # set up socket connection
         self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self._socket.settimeout(timeout)
+        configure_socket(self._socket, tcp_nodelay=tcp_nodelay)
         self._socket.connect((ip, 29999))
         time.sleep(0.1)
         self._socket.recv(2048)
 
         self._mutex_lock = Lock()
 
-        self._primary = URRobotPrimary(ip, timeout)
+        self._primary = URRobotPrimary(ip, timeout, tcp_nodelay=tcp_nodelay)
 
     def close(self):
         self._socket.close()
@@ -14,9 +14,11 @@ from typing import Dict, Any, Optional
 
 from urx.ursecmon import ParserUtils, ParsingException
 
+from alab_control.robot_arm_ur5e.utils import configure_socket
+
 
 class URRobotPrimary:
-    def __init__(self, ip: str, timeout: float = 5):
+    def __init__(self, ip: str, timeout: float = 5, tcp_nodelay: bool = True):
         """
         The primary interface (30011, read-only) to UR Robot
 
@@ -25,10 +27,12 @@ class URRobotPrimary:
         Args:
             ip: the ip address to the UR Robot
             timeout: timeout time in sec
+            tcp_nodelay: disable Nagle's algorithm on the socket
         """
         # set up socket connection
         self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self._socket.settimeout(timeout)
+        configure_socket(self._socket, tcp_nodelay=tcp_nodelay)
         self._socket.connect((ip, 30011))
         time.sleep(0.1)
         self._socket.recv(4096)
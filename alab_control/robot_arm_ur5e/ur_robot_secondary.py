@@ -6,14 +6,20 @@ from _socket import timeout
 from urx import URRobot
 from urx.ursecmon import TimeoutException
 
+from alab_control.robot_arm_ur5e.utils import configure_socket
+
 
 class URRobotSecondary:
-    def __init__(self, ip: str):
+    def __init__(self, ip: str, tcp_nodelay: bool = True):
         self.ip = ip
         try:
             self._robot: URRobot = URRobot(host=self.ip)
         except (TimeoutException, timeout) as exc:
             raise Exception("Something wrong with the UR Robot secondary port. Try again later.") from exc
+        # urx opens the secondary socket itself, tune it once it is connected
+        secondary_socket = getattr(self._robot.secmon, "_s_secondary", None)
+        if secondary_socket is not None:
+            configure_socket(secondary_socket, tcp_nodelay=tcp_nodelay)
     
     def movej(
             self,
@@ -39,7 +45,11 @@ class URRobotSecondary:
         if self.is_running():
             raise ValueError("Robot arm is still running")
         self._robot.secmon.send_program(program)
-        time.sleep(0.5)  # make sure the robot arm receives and start to run the program
+        # make sure the robot arm receives and start to run the program, but do not wait
+        # longer than needed once it reports the program as running
+        deadline = time.monotonic() + 0.5
+        while not self.is_running() and time.monotonic() < deadline:
+            time.sleep(0.01)
         if block:
             self.wait_for_finish()
 
@@ -1,53 +1,149 @@
 import gzip
+import logging
+import shlex
+import tarfile
+import threading
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 
 import paramiko
 
 from alab_control.robot_arm_ur5e.utils import get_header, replace_header
 
+logger = logging.getLogger(__name__)
+
 
 class URRobotSSH:
     def __init__(self, ip: str):
         self.ip = ip
         self._ssh = paramiko.SSHClient()
         self._ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        self._connect()
+        # each thread opens one sftp session on first use and keeps it until close(), instead of one per
+        # call; an SFTPClient must not be shared between threads, but its channels on one transport can
+        self._local = threading.local()
+        self._sftp_clients: List[paramiko.SFTPClient] = []
+        self._sftp_lock = threading.Lock()
+        # remote path -> (mtime, size, content); a file is downloaded again when its mtime or size changes.
+        # st_mtime only has a resolution of one second, so every write through this client also drops the entry
+        self._program_cache: Dict[str, Tuple[float, int, str]] = {}
+
+    def _connect(self):
         self._ssh.connect(self.ip, username="root", password="easybot")
 
+    def _get_sftp(self) -> paramiko.SFTPClient:
+        sftp: Optional[paramiko.SFTPClient] = getattr(self._local, "sftp", None)
+        if sftp is not None and not sftp.get_channel().closed:
+            return sftp
+        with self._sftp_lock:
+            transport = self._ssh.get_transport()
+            if transport is None or not transport.is_active():
+                # the connection dropped (e.g. the robot arm rebooted), log in again
+                self._connect()
+            try:
+                sftp = self._ssh.open_sftp()
+            except paramiko.SSHException:
+                self._connect()
+                sftp = self._ssh.open_sftp()
+            self._sftp_clients = [client for client in self._sftp_clients if not client.get_channel().closed]
+            self._sftp_clients.append(sftp)
+        self._local.sftp = sftp
+        return sftp
+
+    def _read_cached(self, sftp: paramiko.SFTPClient, path: str) -> str:
+        stat = sftp.stat(path)
+        cached = self._program_cache.get(path)
+        if cached is not None and cached[:2] == (stat.st_mtime, stat.st_size):
+            return cached[2]
+        with sftp.open(path, "r") as f:
+            # request every chunk up front instead of one read request per round trip
+            f.prefetch(stat.st_size)
+            content = f.read().decode("utf-8")
+        self._program_cache[path] = (stat.st_mtime, stat.st_size, content)
+        return content
+
     def read_file(self, file_path: str):
-        with self._ssh.open_sftp() as sftp:
-            with sftp.open(Path(file_path).as_posix(), "r") as f:
-                file = f.read().decode("utf-8")
+        sftp = self._get_sftp()
+        with sftp.open(Path(file_path).as_posix(), "r") as f:
+            file = f.read().decode("utf-8")
         return file
 
     def read_program(self, file_name: str, base: str = "/programs", header_file_name: Optional[str] = None) -> str:
-        with self._ssh.open_sftp() as sftp:
-            with sftp.open((Path(base) / file_name).as_posix(), "r") as f:
-                program_file = f.read().decode("utf-8")
-            if header_file_name is not None:
-                with sftp.open((Path(base) / header_file_name).as_posix(), "r") as f:
-                    header_file = f.read().decode("utf-8")
-                program_file = replace_header(program_file, get_header(header_file))
+        sftp = self._get_sftp()
+        program_file = self._read_cached(sftp, (Path(base) / file_name).as_posix())
+        if header_file_name is not None:
+            header_file = self._read_cached(sftp, (Path(base) / header_file_name).as_posix())
+            program_file = replace_header(program_file, get_header(header_file))
         return program_file
 
+    def read_programs(self, file_names: List[str], base: str = "/programs") -> Dict[str, str]:
+        """
+        Read several programs over a single SFTP session, returning a dict from file name to content.
+        """
+        programs = {}
+        sftp = self._get_sftp()
+        for file_name in file_names:
+            programs[file_name] = self._read_cached(sftp, (Path(base) / file_name).as_posix())
+        return programs
+
+    def prefetch_programs(self, file_names: List[str], base: str = "/programs") -> Dict[str, str]:
+        """
+        Pull several programs in one ``tar`` stream over a single ssh command, instead of one SFTP
+        round trip per file. The programs also fill the read cache, so later ``read_program`` calls
+        only check their mtime. Files missing on the robot arm are left out of the returned dict.
+
+        This is only a warm-up: if ``tar`` fails, a warning is logged and whatever could not be
+        prefetched is read on demand instead.
+        """
+        command = f"tar -cf - -C {shlex.quote(base)} " + " ".join(shlex.quote(name) for name in file_names)
+        programs = {}
+        try:
+            _, stdout, stderr = self._ssh.exec_command(command)
+            with tarfile.open(fileobj=stdout, mode="r|") as tar:
+                for member in tar:
+                    if not member.isfile():
+                        continue
+                    content = tar.extractfile(member).read().decode("utf-8")
+                    self._program_cache[(Path(base) / member.name).as_posix()] = (member.mtime, member.size, content)
+                    programs[member.name] = content
+            exit_status = stdout.channel.recv_exit_status()
+        except (tarfile.TarError, paramiko.SSHException) as e:
+            logger.warning("Could not prefetch programs from %s, reading them on demand: %s", base, e)
+            return programs
+        if exit_status != 0:
+            logger.warning(
+                "tar exited with status %s while prefetching programs from %s: %s",
+                exit_status, base, stderr.read().decode("utf-8", errors="replace").strip(),
+            )
+        return programs
+
     def write_program(self, file_name: str, program_string: str, base: str = "/programs"):
-        with self._ssh.open_sftp() as sftp:
-            with sftp.open((Path(base) / file_name).as_posix(), "w") as f:
-                f.write(program_string)
+        sftp = self._get_sftp()
+        path = (Path(base) / file_name).as_posix()
+        self._program_cache.pop(path, None)
+        with sftp.open(path, "w", bufsize=32768) as f:
+            # send the writes without waiting for each ack, errors are still raised on close
+            f.set_pipelined(True)
+            f.write(program_string)
 
     def compress_write_program(self, file_name: str, program_string: str, base: str = "/programs"):
-        with self._ssh.open_sftp() as sftp:
-            compressed_program = gzip.compress(program_string.encode("utf-8"))
-            with sftp.open((Path(base) / file_name).as_posix(), "wb") as f:
-                f.write(compressed_program)
+        sftp = self._get_sftp()
+        compressed_program = gzip.compress(program_string.encode("utf-8"))
+        path = (Path(base) / file_name).as_posix()
+        self._program_cache.pop(path, None)
+        with sftp.open(path, "wb", bufsize=32768) as f:
+            f.set_pipelined(True)
+            f.write(compressed_program)
     
     def upload_file(self, local_file_path: str, remote_file_path: str):
-        with self._ssh.open_sftp() as sftp:
-            sftp.put(local_file_path, remote_file_path)
+        sftp = self._get_sftp()
+        self._program_cache.pop(Path(remote_file_path).as_posix(), None)
+        sftp.put(local_file_path, remote_file_path)
 
     def remove_file(self, file_path: str):
-        with self._ssh.open_sftp() as sftp:
-            sftp.remove(file_path)
+        sftp = self._get_sftp()
+        self._program_cache.pop(Path(file_path).as_posix(), None)
+        sftp.remove(file_path)
         
     def download_folder(self, remote_folder_path: str, local_folder_path: str, remove_remote_files: bool = False):
         """
@@ -55,15 +151,21 @@ class URRobotSSH:
         Download files from the remote folder that are not in the local folder.
         Remove files from the remote folder that are downloaded if remove_remote_files is True.
         """
-        with self._ssh.open_sftp() as sftp:
-            for remote_file in sftp.listdir(remote_folder_path):
-                local_file = Path(local_folder_path) / remote_file
-                if not local_file.exists():
-                    sftp.get(remote_folder_path + "/" + remote_file, local_file.as_posix())
-                    if remove_remote_files:
-                        sftp.remove(remote_folder_path + "/" + remote_file)
+        sftp = self._get_sftp()
+        for remote_file in sftp.listdir(remote_folder_path):
+            local_file = Path(local_folder_path) / remote_file
+            if not local_file.exists():
+                sftp.get(remote_folder_path + "/" + remote_file, local_file.as_posix())
+                if remove_remote_files:
+                    self._program_cache.pop(Path(remote_folder_path, remote_file).as_posix(), None)
+                    sftp.remove(remote_folder_path + "/" + remote_file)
 
     def close(self):
+        with self._sftp_lock:
+            for sftp in self._sftp_clients:
+                sftp.close()
+            self._sftp_clients.clear()
+        self._local = threading.local()
         self._ssh.close()
 
 
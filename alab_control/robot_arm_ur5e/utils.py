@@ -1,4 +1,5 @@
 import re
+import socket
 
 
 def get_header(file_string: str):
@@ -18,15 +19,37 @@ def replace_header(orginal_file: str, new_header: str):
     )
 
 
+def make_template_base(program_doc):
+    """
+    The part of the template config shared by every position of a program
+    """
+    return {"approach_distance_mm": program_doc["approach_distance_mm"],
+            "gripper_open_mm": program_doc["gripper_open_mm"], "start_pose": program_doc["start_pos"]["pose"],
+            "start_qnear": program_doc["start_pos"]["joint"],
+            "trans_poses": [pos["pose"] for pos in program_doc["transition_waypoints"]],
+            "trans_qnears": [pos["joint"] for pos in program_doc["transition_waypoints"]]}
+
+
+def fill_position(base, position_name, pick_positions):
+    """
+    Complete a config from ``make_template_base`` with one pick position, where ``pick_positions``
+    maps the position names to the position docs of the program
+    """
+    return {**base,
+            "pick_pose": pick_positions[position_name]["pose"],
+            "pick_qnear": pick_positions[position_name]["joint"]}
+
+
 def make_template_config(program_doc, position_name):
-    config = {"approach_distance_mm": program_doc["approach_distance_mm"],
-              "gripper_open_mm": program_doc["gripper_open_mm"], "start_pose": program_doc["start_pos"]["pose"],
-              "start_qnear": program_doc["start_pos"]["joint"],
-              "trans_poses": [pos["pose"] for pos in program_doc["transition_waypoints"]],
-              "trans_qnears": [pos["joint"] for pos in program_doc["transition_waypoints"]]}
-
-    pick_positions = {pos["name"]: {"pose": pos["pose"], "joint": pos["joint"]}
-                      for pos in program_doc["pick_position"]}
-    config["pick_pose"] = pick_positions[position_name]["pose"]
-    config["pick_qnear"] = pick_positions[position_name]["joint"]
-    return config
+    pick_positions = {pos["name"]: pos for pos in program_doc["pick_position"]}
+    return fill_position(make_template_base(program_doc), position_name, pick_positions)
+
+
+def configure_socket(sock: socket.socket, tcp_nodelay: bool = True):
+    """
+    Tune a command socket to the robot arm: keep the connection alive and, with ``tcp_nodelay``,
+    send each small command right away instead of letting Nagle's algorithm hold it back.
+    """
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    if tcp_nodelay:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)